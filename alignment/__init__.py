@@ -1 +1,3 @@
 __author__ = 'eser'
+
+from .pairwise import pairwise_matrix
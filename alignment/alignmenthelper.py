@@ -2,55 +2,144 @@ from .sequence import Sequence
 from .vocabulary import Vocabulary
 from . import sequencealigner as seqal
 
-class AlignmentHelper(object):
-    '''Helper class to simplify alignment.'''
-    def __init__(self):
+
+# Sessions of the per-call alignment functions, keyed by the identity of
+# the substitution matrix and the other scoring parameters. The matrix is
+# kept with its session, so that its id is not reused while cached.
+sessions = {}
+MAX_SESSIONS = 16
+
+
+def clearsessions():
+    '''Forget all cached sessions.'''
+    sessions.clear()
+
+
+def cachedsession(substMatrix, gapScore, mode, matchScore, mismatchScore,
+                  bandWidth=None):
+    '''AlignmentHelper session for the given scoring, built on the first
+    call and reused after that. A substitution matrix must not be changed
+    once it has been used here.'''
+    key = (id(substMatrix), gapScore, mode, matchScore, mismatchScore,
+           bandWidth)
+    try:
+        return sessions[key][1]
+    except KeyError:
         pass
+    session = AlignmentHelper(substMatrix, gapScore, mode,
+                              matchScore, mismatchScore, bandWidth)
+    if len(sessions) >= MAX_SESSIONS:
+        sessions.clear()
+    sessions[key] = (substMatrix, session)
+    return session
 
-    def alignStrict(self, first, second,
-                    matchScore=None, mismatchScore=None,
-                    substMatrix=None, gapScore=-1, btrace=True):
-        voc = Vocabulary()
-        fe = voc.encodeSequence(Sequence(first))
-        se = voc.encodeSequence(Sequence(second))
+
+class AlignmentHelper(object):
+    '''Helper class to simplify alignment.
+
+    Given a scoring, the helper is a session: the vocabulary, the encoded
+    substitution matrix and the aligner are set up once and reused by
+    align(), score() and score_many(). With a substitution matrix the
+    vocabulary is frozen to the matrix alphabet.
+    '''
+
+    aligners = {
+        'strict': seqal.StrictGlobalSequenceAligner,
+        'global': seqal.GlobalSequenceAligner,
+        'local': seqal.LocalSequenceAligner,
+    }
+
+    def __init__(self, substMatrix=None, gapScore=-1, mode='strict',
+                 matchScore=None, mismatchScore=None, bandWidth=None):
+        if mode not in self.aligners and mode != 'banded':
+            raise ValueError('Unknown alignment mode: %r' % mode)
+        self.vocabulary = Vocabulary()
         if matchScore is not None and mismatchScore is not None:
             scoring = seqal.SimpleScoring(matchScore, mismatchScore)
         elif substMatrix is not None:
             scoring = seqal.MatrixScoring(
-                voc.encodeScoreMatrix(substMatrix))
+                self.vocabulary.encodeScoreMatrix(substMatrix))
+            self.vocabulary.freeze()
         else:
+            scoring = None
+        if scoring is None:
+            self.aligner = None
+        elif mode == 'banded':
+            self.aligner = seqal.BandedStrictGlobalSequenceAligner(
+                scoring, gapScore, bandWidth
+            )
+        else:
+            self.aligner = self.aligners[mode](scoring, gapScore)
+
+    def encode(self, sequence):
+        return self.vocabulary.encodeSequence(Sequence(sequence))
+
+    def check(self):
+        if self.aligner is None:
             raise TypeError('No score provided.')
-        aligner = seqal.StrictGlobalSequenceAligner(
-            scoring, gapScore
-        )
+
+    def align(self, first, second):
+        '''Score and decoded alignments of first and second.'''
+        self.check()
+        score, alignments = self.aligner.align(
+            self.encode(first), self.encode(second), backtrace=True)
+        return score, [self.vocabulary.decodeSequenceAlignment(g)
+                       for g in alignments]
+
+    def score(self, first, second):
+        '''Score of aligning first and second.'''
+        self.check()
+        return self.aligner.align(self.encode(first), self.encode(second))
+
+    def score_many(self, first, seconds):
+        '''Scores of aligning first with each of seconds.'''
+        self.check()
+        return self.aligner.align_many(
+            self.encode(first), self.vocabulary.encode_many(seconds))
+
+    def best_matches(self, first, seconds, k=1):
+        '''Indices and scores of the k sequences of seconds that align
+        best with first, best first.'''
+        self.check()
+        return self.aligner.best_matches(
+            self.encode(first), self.vocabulary.encode_many(seconds), k)
+
+    def alignStrict(self, first, second,
+                    matchScore=None, mismatchScore=None,
+                    substMatrix=None, gapScore=-1, btrace=True,
+                    banded=False, bandWidth=None):
+        session = cachedsession(substMatrix, gapScore,
+                                'banded' if banded else 'strict',
+                                matchScore, mismatchScore, bandWidth)
         if btrace:
-            score, alignments = aligner.align(fe, se, backtrace=btrace)
-            return score, [voc.decodeSequenceAlignment(g)
-                           for g in alignments]
+            return session.align(first, second)
         else:
-            score = aligner.align(fe, se, backtrace=btrace)
-            return score
+            return session.score(first, second)
+
+    def alignStrictMany(self, first, seconds,
+                        matchScore=None, mismatchScore=None,
+                        substMatrix=None, gapScore=-1):
+        '''Scores of strict global alignments of first with each of
+        seconds.'''
+        session = cachedsession(substMatrix, gapScore, 'strict',
+                                matchScore, mismatchScore)
+        return session.score_many(first, seconds)
+
+    def bestStrictMatches(self, first, seconds, k=1,
+                          matchScore=None, mismatchScore=None,
+                          substMatrix=None, gapScore=-1):
+        '''Indices and scores of the k sequences of seconds with the best
+        strict global alignments with first, best first.'''
+        session = cachedsession(substMatrix, gapScore, 'strict',
+                                matchScore, mismatchScore)
+        return session.best_matches(first, seconds, k)
 
     def alignLocal(self, first, second,
                     matchScore=None, mismatchScore=None,
                     substMatrix=None, gapScore=-1, btrace=True):
-        voc = Vocabulary()
-        fe = voc.encodeSequence(Sequence(first))
-        se = voc.encodeSequence(Sequence(second))
-        if matchScore is not None and mismatchScore is not None:
-            scoring = seqal.SimpleScoring(matchScore, mismatchScore)
-        elif substMatrix is not None:
-            scoring = seqal.MatrixScoring(
-                voc.encodeScoreMatrix(substMatrix))
-        else:
-            raise TypeError('No score provided.')
-        aligner = seqal.LocalSequenceAligner(
-            scoring, gapScore
-        )
+        session = cachedsession(substMatrix, gapScore, 'local',
+                                matchScore, mismatchScore)
         if btrace:
-            score, alignments = aligner.align(fe, se, backtrace=btrace)
-            return score, [voc.decodeSequenceAlignment(g)
-                           for g in alignments]
+            return session.align(first, second)
         else:
-            score = aligner.align(fe, se, backtrace=btrace)
-            return score
+            return session.score(first, second)
@@ -0,0 +1,73 @@
+#
+# File: boxgrid.py
+#
+# Description: Vectorized conversions between rotations and the boxes
+#  of the 81x81x81 grid used by conv.ev2box and conv.box2ev.
+#
+import math
+import numpy as np
+
+import alignment.conv as conv
+
+pi = math.pi
+size = 81
+
+
+def coord2idx(c):
+    '''Box coordinates -> box indices, for an array of coordinates'''
+    return np.ceil((np.asarray(c) + pi)*size / (2*pi)).astype(int)
+
+
+def idx2coord(c):
+    '''Box indices -> coordinates of the box centres'''
+    return -pi + 2*pi*(np.asarray(c) - 0.5)/size
+
+
+class BoxGrid(object):
+    '''Converts stacks of rotations to and from box indices with a single
+    NumPy pass. With lookup=True the rotations of all 81^3 boxes are
+    computed up front, and rotations() becomes a table lookup.'''
+
+    def __init__(self, lookup=False):
+        self.magic = conv.magicmat
+        if lookup:
+            boxes = np.indices((size, size, size)).reshape(3, -1).T + 1
+            self.table = self.computerotations(boxes)
+            self.table.setflags(write=False)
+        else:
+            self.table = None
+
+    def boxes(self, rotations):
+        '''N x 3 x 3 rotation matrices -> N x 3 box indices'''
+        angles, axes = conv.mat2ev_batch(np.matmul(self.magic, rotations))
+        coords = angles[..., None] * axes
+        # mat2ev leaves out the axes of very small rotations, which lie
+        # well inside the central box anyway.
+        coords[np.isnan(coords)] = 0
+        return coord2idx(coords)
+
+    def rotations(self, boxes):
+        '''N x 3 box indices -> N x 3 x 3 rotation matrices of the box
+        centres'''
+        boxes = np.asarray(boxes)
+        if self.table is None:
+            return self.computerotations(boxes)
+        index = np.ravel_multi_index(np.moveaxis(boxes - 1, -1, 0),
+                                     (size, size, size))
+        return self.table[index]
+
+    def computerotations(self, boxes):
+        u = idx2coord(boxes)
+        angles = np.sqrt((u**2).sum(axis=-1))
+        # The centre of the central box is the identity.
+        u[angles == 0] = (1, 0, 0)
+        return np.matmul(np.transpose(self.magic),
+                         conv.ev2mat_batch(angles, u))
+
+    def ev2box(self, angles, axes):
+        '''Batch version of conv.ev2box'''
+        return self.boxes(conv.ev2mat_batch(angles, axes))
+
+    def box2ev(self, boxes):
+        '''Batch version of conv.box2ev'''
+        return conv.mat2ev_batch(self.rotations(boxes))
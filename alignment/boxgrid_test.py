@@ -0,0 +1,39 @@
+import numpy
+
+from . import boxgrid
+from . import conv
+
+
+BOXES = numpy.array([[1, 1, 1], [10, 20, 30], [32, 70, 31],
+                     [81, 40, 2]])
+
+
+def test_box2ev_matches_scalar():
+    angles, axes = boxgrid.BoxGrid().box2ev(BOXES)
+    for box, angle, axis in zip(BOXES, angles, axes):
+        expected = conv.box2ev(list(box))
+        assert abs(angle - expected[0]) < 1e-9
+        assert numpy.allclose(axis, expected[1])
+
+
+def test_ev2box_matches_scalar():
+    angles = numpy.array([0.1, 1.0, 2.0, 3.0])
+    axes = numpy.array([[1.0, 0.0, 0.0], [0.2, -0.4, 1.0],
+                        [-1.0, -1.0, 0.3], [0.0, 1.0, 1.0]])
+    boxes = boxgrid.BoxGrid().ev2box(angles, axes)
+    for angle, axis, box in zip(angles, axes, boxes):
+        assert list(box) == conv.ev2box(angle, axis)
+
+
+def test_lookup_table():
+    grid = boxgrid.BoxGrid()
+    table = boxgrid.BoxGrid(lookup=True)
+    assert table.table.shape == (81 ** 3, 3, 3)
+    assert numpy.allclose(table.rotations(BOXES), grid.rotations(BOXES))
+    assert numpy.array_equal(grid.boxes(grid.rotations(BOXES[1:3])),
+                             BOXES[1:3])
+
+
+def test_central_box():
+    rotation = boxgrid.BoxGrid().rotations([[41, 41, 41]])[0]
+    assert numpy.allclose(rotation, conv.magicmat.T)
@@ -0,0 +1,69 @@
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
+
+from .sequence import Sequence
+from .vocabulary import Vocabulary
+from .sequenceloader import localpatternsequenceloader
+from . import sequencealigner as seqal
+
+
+# Candidate library -----------------------------------------------------------
+
+class CandidateLibrary(object):
+    '''Local pattern candidates, parsed and encoded once.
+
+    candidates maps pattern strings to their rotations. Candidates with the
+    same word sequence share one encoded sequence, so every distinct
+    sequence is aligned only once per target.
+    '''
+
+    def __init__(self, candidates, window, matrix, gapScore=-1):
+        loader = localpatternsequenceloader()
+        self.names = list(candidates)
+        self.rotations = numpy.array([candidates[name]
+                                      for name in self.names], float)
+        self.vocabulary = Vocabulary()
+        scoring = seqal.MatrixScoring(
+            self.vocabulary.encodeScoreMatrix(matrix))
+        self.aligner = seqal.StrictGlobalSequenceAligner(scoring, gapScore)
+
+        # Candidate i has the word sequence words[index[i]], and first[j]
+        # is the first candidate with the word sequence words[j].
+        self.words = list()
+        first = list()
+        index = list()
+        unique = dict()
+        for i, name in enumerate(self.names):
+            words = loader.load(name, window)
+            key = tuple(words)
+            if key not in unique:
+                unique[key] = len(self.words)
+                self.words.append(words)
+                first.append(i)
+            index.append(unique[key])
+        self.index = numpy.array(index, int)
+        self.first = numpy.array(first, int)
+        self.sequences = self.vocabulary.encode_many(self.words)
+        self.vocabulary.freeze()
+
+    def encode(self, words):
+        return self.vocabulary.encodeSequence(Sequence(words))
+
+    def best_matches(self, words, k=1):
+        '''The k candidates that align best with the given word sequence,
+        best first, as (name, words, rotation, score) tuples. Ties go to the
+        earlier candidate.'''
+        matches = self.aligner.best_matches(self.encode(words),
+                                            self.sequences, k)
+        # The best k candidates all have one of the best k sequences.
+        scores = dict(matches)
+        best = sorted((-scores[j], i) for i, j in enumerate(self.index)
+                      if j in scores)[:k]
+        return [(self.names[i], self.words[self.index[i]],
+                 tuple(self.rotations[i].tolist()), -score)
+                for score, i in best]
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,37 @@
+from .alignmenthelper import AlignmentHelper
+from .candidatelibrary import CandidateLibrary
+from .sequenceloader import localpatternsequenceloader
+from .substmatrices import SubstitutionMatrices
+
+
+CANDIDATES = {
+    '0-4:100-104_H2:102-H100:4+_LLLL_L': (0.1, 1.0, 0.0, 0.0),
+    '0-4:100-104_H2:102-H100:4-_LLLL_-2': (0.2, 0.0, 1.0, 0.0),
+    '0-4:200-204_H2:202-H200:4-_LLLL_-2': (0.3, 0.0, 0.0, 1.0),
+    '0-4:100-104_H2:102+H100:4+_LLLL_-3': (0.4, 1.0, 1.0, 0.0),
+    '0-4:100-104_H2:102-_LLLL_-2': (0.5, 0.0, 1.0, 1.0),
+}
+
+
+def test_candidate_library():
+    matrix = SubstitutionMatrices('length').bondlength
+    library = CandidateLibrary(CANDIDATES, 2, matrix, -1)
+    assert len(library) == 5
+    assert len(library.sequences) == 4
+    assert library.rotations.shape == (5, 4)
+
+    loader = localpatternsequenceloader()
+    helper = AlignmentHelper()
+    target = loader.load('0-4:100-104_H2:102-H100:4-_LLLL_-2', 2)
+    scores = [(-helper.alignStrict(target, loader.load(name, 2),
+                                   substMatrix=matrix, btrace=False), i)
+              for i, name in enumerate(library.names)]
+    matches = library.best_matches(target, k=3)
+    assert [name for name, _, _, _ in matches] == \
+        [library.names[i] for _, i in sorted(scores)[:3]]
+    name, words, rotation, score = matches[0]
+    assert words == target
+    assert rotation == CANDIDATES[name]
+    assert score == -sorted(scores)[0][0]
+    # Duplicate word sequences are listed once per candidate.
+    assert matches[1][1] == target
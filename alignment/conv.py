@@ -19,12 +19,12 @@ def coord2idx(c):
     # The boxes are numbered 1..81, with box i covering [-pi +
     # 2pi*(i-1)/81, -pi + 2pi*i/81]. Hence the index corresponding to
     # a given coordinate w is ceil((w+pi)*81/2pi).
-    return map(lambda x: int(math.ceil((x + pi)*81 / (2*pi))), c)
+    return [int(math.ceil((x + pi)*81 / (2*pi))) for x in c]
 
 
 def idx2coord(c):
     '''Box id's -> box coorindates conversion'''
-    return map(lambda x: -pi + 2*pi*(x - 0.5)/81, c)
+    return [-pi + 2*pi*(x - 0.5)/81 for x in c]
 
 
 def so3dist(A, B):
@@ -48,6 +48,43 @@ def ev2mat(angle, u):
     return np.identity(3) + math.sin(angle)*k + (1-math.cos(angle))*k2
 
 
+def ev2mat_batch(angles, axes):
+    """
+    Convert arrays of N angles and N axes (N x 3, not necessarily unit
+    vectors) to the corresponding N x 3 x 3 rotation matrices.
+    """
+    angles = np.asarray(angles, dtype=float)
+    u = np.asarray(axes, dtype=float)
+    u = u / np.sqrt((u**2).sum(axis=-1))[..., None]
+    k = np.zeros(u.shape[:-1] + (3, 3))
+    k[..., 0, 1] = -u[..., 2]
+    k[..., 0, 2] = u[..., 1]
+    k[..., 1, 0] = u[..., 2]
+    k[..., 1, 2] = -u[..., 0]
+    k[..., 2, 0] = -u[..., 1]
+    k[..., 2, 1] = u[..., 0]
+    k2 = np.matmul(k, k)
+    return np.identity(3) + np.sin(angles)[..., None, None]*k \
+        + (1-np.cos(angles))[..., None, None]*k2
+
+
+def so3dist_batch(A, B):
+    '''Returns the angles between the rotation matrices of the stacks
+    A and B (both N x 3 x 3), pair by pair'''
+    t = np.einsum('nij,nij->n', A, B)
+    t = np.clip(t, -1.0, 3.0)  # make sure -1<=t<=3
+    return np.arccos((t - 1)/2)
+
+
+def so3dist_pairwise(A, B):
+    '''Returns the matrix of angles between the rotation matrices of
+    the stacks A (K x 3 x 3) and B (L x 3 x 3)'''
+    # trace(A^T B) is the sum of the elementwise products.
+    t = np.einsum('kij,lij->kl', A, B)
+    t = np.clip(t, -1.0, 3.0)  # make sure -1<=t<=3
+    return np.arccos((t - 1)/2)
+
+
 def mat2ev(m):
     '''
     Convert a rotation matrix to the corresponding angle, unit
@@ -72,7 +109,7 @@ def mat2ev(m):
 
     if tr < 0:
         B = (m + np.identity(3)) / 2
-        u = np.array(map(math.sqrt, B.diagonal()))
+        u = np.sqrt(np.maximum(B.diagonal(), 0))
         if u[0] > 0:
             u[1] = u[1] * math.copysign(1, m[0, 1])
             u[2] = u[2] * math.copysign(1, m[0, 2])
@@ -82,26 +119,63 @@ def mat2ev(m):
         return angle, u/math.sqrt(np.dot(u, u))
 
 
+def mat2ev_batch(M):
+    '''
+    Convert a stack of N rotation matrices to the corresponding arrays
+    of N angles and N x 3 unit vectors, like mat2ev. Rotations by a
+    small non-zero angle, for which mat2ev returns None, get NaN axes.
+    '''
+    M = np.asarray(M, dtype=float)
+    tr = np.trace(M, axis1=-2, axis2=-1)
+    angle = np.arccos(np.clip((tr - 1)/2, -1.0, 1.0))
+    axes = np.full(M.shape[:-1], np.nan)
+
+    zero = angle == 0
+    axes[zero] = (1, 0, 0)
+
+    general = ~zero & (np.sin(angle) > 0.0001)
+    u = np.stack([M[..., 2, 1]-M[..., 1, 2],
+                  M[..., 0, 2]-M[..., 2, 0],
+                  M[..., 1, 0]-M[..., 0, 1]], axis=-1)[general]
+    axes[general] = u / np.sqrt((u**2).sum(axis=-1))[..., None]
+
+    flipped = ~zero & ~general & (tr < 0)
+    m = M[flipped]
+    B = (m + np.identity(3)) / 2
+    u = np.sqrt(np.maximum(np.diagonal(B, axis1=-2, axis2=-1), 0))
+    first = u[:, 0] > 0
+    u[:, 1] *= np.where(first, np.copysign(1, m[:, 0, 1]), 1)
+    u[:, 2] *= np.where(first, np.copysign(1, m[:, 0, 2]),
+                        np.copysign(1, m[:, 1, 2]))
+    axes[flipped] = u / np.sqrt((u**2).sum(axis=-1))[..., None]
+    return angle, axes
+
+
 def makemagicmat():
     c = [32, 70, 31]
     u = idx2coord(c)
     n = math.sqrt(np.dot(u, u))
-    return np.transpose(ev2mat(n, map(lambda x: x/n, u)))
+    return np.transpose(ev2mat(n, [x/n for x in u]))
+
+
+# Built once, see makemagicmat.
+magicmat = makemagicmat()
+magicmat.setflags(write=False)
 
 
 def box2ev(c):
     u = idx2coord(c)
     angle = math.sqrt(np.dot(u, u))
-    M = np.dot(np.transpose(makemagicmat()),
-               ev2mat(angle, map(lambda x: x/angle, u)))
+    M = np.dot(np.transpose(magicmat),
+               ev2mat(angle, [x/angle for x in u]))
     return mat2ev(M)
 
 
 def ev2box(angle, u):
     B = ev2mat(angle, u)
-    M = np.dot(makemagicmat(), B)
+    M = np.dot(magicmat, B)
     a, v = mat2ev(M)
-    return coord2idx(map(lambda x: x*a, v))
+    return coord2idx([x*a for x in v])
 
 
 def lst2mat(l):
@@ -0,0 +1,45 @@
+import math
+
+import numpy
+
+from . import conv
+
+
+def _rotations():
+    angles = numpy.array([0.0, 0.3, 1.2, 2.5, math.pi - 1e-6,
+                          math.pi - 1e-5])
+    axes = numpy.array([[1.0, 2.0, 3.0], [0.0, 0.0, 2.0],
+                        [1.0, -1.0, 0.5], [-0.3, 0.2, 0.9],
+                        [1.0, 2.0, 3.0], [-1.0, 0.5, -2.0]])
+    return angles, axes
+
+
+def test_ev2mat_batch():
+    angles, axes = _rotations()
+    rotations = conv.ev2mat_batch(angles, axes)
+    assert rotations.shape == (len(angles), 3, 3)
+    for angle, axis, rotation in zip(angles, axes, rotations):
+        assert numpy.allclose(rotation, conv.ev2mat(angle, axis))
+
+
+def test_so3dist_batch():
+    angles, axes = _rotations()
+    first = conv.ev2mat_batch(angles, axes)
+    second = first[::-1]
+    dists = conv.so3dist_batch(first, second)
+    for a, b, dist in zip(first, second, dists):
+        assert abs(dist - conv.so3dist(a, b)) < 1e-6
+    pairwise = conv.so3dist_pairwise(first, second)
+    assert numpy.allclose(numpy.diagonal(pairwise), dists)
+
+
+def test_mat2ev_batch():
+    angles, axes = _rotations()
+    rotations = numpy.array([conv.ev2mat(angle, axis)
+                             for angle, axis in zip(angles, axes)])
+    batchAngles, batchAxes = conv.mat2ev_batch(rotations)
+    for rotation, angle, axis in zip(rotations, batchAngles, batchAxes):
+        expected = conv.mat2ev(rotation)
+        assert abs(angle - expected[0]) < 1e-9
+        assert numpy.allclose(axis, expected[1])
+    assert tuple(batchAxes[0]) == (1, 0, 0)
@@ -0,0 +1,96 @@
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
+
+
+# Pairwise scores -------------------------------------------------------------
+
+def pairwise_matrix(sequences, aligner, workers=None, symmetric=None,
+                    tileSize=64, progress=None):
+    '''Scores of aligning every sequence with every other one.
+
+    Entry (i, j) is aligner.align(sequences[i], sequences[j]). If the aligner
+    is symmetric only the upper triangle is computed and then mirrored.
+    Tiles of the matrix are computed by a pool of worker processes writing
+    into shared memory, or in this process if workers is 1. If given,
+    progress(done, total) is called each time a tile is finished.
+    '''
+    sequences = list(sequences)
+    size = len(sequences)
+    if symmetric is None:
+        symmetric = aligner.isSymmetric()
+    tiles = list(pairwiseTiles(size, tileSize, symmetric))
+    if workers == 1 or len(tiles) <= 1:
+        scores = numpy.zeros((size, size))
+        for done, tile in enumerate(tiles, 1):
+            fillTile(scores, sequences, aligner, symmetric, tile)
+            if progress is not None:
+                progress(done, len(tiles))
+    else:
+        scores = parallelScores(sequences, aligner, symmetric, tiles,
+                                workers, progress)
+    if symmetric:
+        lower = numpy.tril_indices(size, -1)
+        scores[lower] = scores.T[lower]
+    return scores
+
+
+def pairwiseTiles(size, tileSize, symmetric):
+    # Row and column ranges of the tiles to compute.
+    for rowStart in range(0, size, tileSize):
+        for colStart in range(rowStart if symmetric else 0, size, tileSize):
+            yield (rowStart, min(size, rowStart + tileSize),
+                   colStart, min(size, colStart + tileSize))
+
+
+def fillTile(scores, sequences, aligner, symmetric, tile):
+    rowStart, rowStop, colStart, colStop = tile
+    for i in range(rowStart, rowStop):
+        start = max(colStart, i) if symmetric else colStart
+        if start < colStop:
+            scores[i, start:colStop] = aligner.align_many(
+                sequences[i], sequences[start:colStop])
+
+
+def parallelScores(sequences, aligner, symmetric, tiles, workers, progress):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from multiprocessing import shared_memory
+
+    size = len(sequences)
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=max(1, size * size * 8))
+    try:
+        with ProcessPoolExecutor(
+                workers, initializer=initWorker,
+                initargs=(memory.name, sequences, aligner,
+                          symmetric)) as pool:
+            futures = [pool.submit(computeTile, tile) for tile in tiles]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress is not None:
+                    progress(done, len(tiles))
+        scores = numpy.ndarray((size, size), buffer=memory.buf).copy()
+    finally:
+        memory.close()
+        memory.unlink()
+    return scores
+
+
+# State of a worker process, set up once by initWorker.
+worker = dict()
+
+
+def initWorker(name, sequences, aligner, symmetric):
+    from multiprocessing import shared_memory
+
+    memory = shared_memory.SharedMemory(name=name)
+    size = len(sequences)
+    worker.update(memory=memory, sequences=sequences, aligner=aligner,
+                  symmetric=symmetric,
+                  scores=numpy.ndarray((size, size), buffer=memory.buf))
+
+
+def computeTile(tile):
+    fillTile(worker['scores'], worker['sequences'], worker['aligner'],
+             worker['symmetric'], tile)
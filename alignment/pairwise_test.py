@@ -0,0 +1,53 @@
+import random
+
+import numpy
+
+from .pairwise import pairwise_matrix
+from .sequence import EncodedSequence
+from .sequencealigner import GlobalSequenceAligner
+from .sequencealigner import MatrixScoring
+
+
+def _sequences(count):
+    rnd = random.Random(count)
+    return [EncodedSequence([rnd.randint(1, 4)
+                             for _ in range(rnd.randint(0, 15))])
+            for _ in range(count)]
+
+
+def _expected(sequences, aligner):
+    return numpy.array([[aligner.align(a, b) for b in sequences]
+                        for a in sequences])
+
+
+def test_pairwise_matrix_symmetric():
+    sequences = _sequences(20)
+    matrix = dict(((a, b), float(a == b) - 0.5 * abs(a - b))
+                  for a in range(1, 5) for b in range(a, 5))
+    aligner = GlobalSequenceAligner(MatrixScoring(matrix), -1)
+    assert aligner.isSymmetric()
+    progress = []
+    scores = pairwise_matrix(sequences, aligner, workers=1, tileSize=8,
+                             progress=lambda done, total:
+                             progress.append((done, total)))
+    assert numpy.array_equal(scores, _expected(sequences, aligner))
+    assert progress == [(1, 6), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6)]
+
+
+def test_pairwise_matrix_asymmetric():
+    sequences = _sequences(12)
+    matrix = dict(((a, b), float(a - b)) for a in range(1, 5)
+                  for b in range(1, 5))
+    aligner = GlobalSequenceAligner(MatrixScoring(matrix), -1)
+    assert not aligner.isSymmetric()
+    scores = pairwise_matrix(sequences, aligner, workers=1, tileSize=5)
+    assert numpy.array_equal(scores, _expected(sequences, aligner))
+
+
+def test_pairwise_matrix_workers():
+    sequences = _sequences(16)
+    matrix = dict(((a, b), float(a == b)) for a in range(1, 5)
+                  for b in range(a, 5))
+    aligner = GlobalSequenceAligner(MatrixScoring(matrix), -1)
+    scores = pairwise_matrix(sequences, aligner, workers=2, tileSize=4)
+    assert numpy.array_equal(scores, _expected(sequences, aligner))
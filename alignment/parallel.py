@@ -0,0 +1,45 @@
+import multiprocessing
+
+
+# Parallel tasks --------------------------------------------------------------
+#
+# Every worker process receives the task function and the data shared by all
+# tasks once, when it starts, instead of with every task. Tasks then only
+# carry their own item.
+
+# Task function and shared data of the current worker process.
+worker = dict()
+
+
+def imap_unordered(function, items, data=None, workers=None, chunksize=1):
+    '''Yield function(item, data) for each item, in order of completion.
+
+    Items are sent to a pool of worker processes in chunks of chunksize.
+    workers defaults to the number of CPUs; with workers=1 the tasks run in
+    this process.
+    '''
+    if data is None:
+        data = dict()
+    if workers == 1:
+        for item in items:
+            yield function(item, data)
+        return
+    pool = multiprocessing.Pool(workers, initWorker, (function, data))
+    try:
+        for result in pool.imap_unordered(runTask, items, chunksize):
+            yield result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def initWorker(function, data):
+    worker['function'] = function
+    worker['data'] = data
+
+
+def runTask(item):
+    return worker['function'](item, worker['data'])
@@ -0,0 +1,18 @@
+from .parallel import imap_unordered
+
+
+def _scale(item, data):
+    return item * data['factor']
+
+
+def test_imap_unordered():
+    for workers in [1, 2]:
+        results = imap_unordered(_scale, range(10), {'factor': 3},
+                                 workers=workers, chunksize=3)
+        assert sorted(results) == [3 * i for i in range(10)]
+
+
+def test_imap_unordered_without_data():
+    results = imap_unordered(lambda item, data: (item, data), [1],
+                             workers=1)
+    assert list(results) == [(1, {})]
@@ -5,12 +5,18 @@ from six.moves import builtins
 
 import operator
 
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
+
 from .sequence import Sequence
 
 
 # Profile ---------------------------------------------------------------------
 
 class SoftElement(object):
+    __slots__ = ('__weights',)
 
     def __init__(self, weights):
         self.__weights = dict(weights)
@@ -85,9 +91,11 @@ class Profile(Sequence):
     @classmethod
     def fromSequenceAlignment(cls, alignment):
         profile = cls()
+        first = alignment.first
+        second = alignment.second
         for i in range(len(alignment)):
-            a = alignment.first[i]
-            b = alignment.second[i]
+            a = first[i]
+            b = second[i]
             if a == b:
                 element = SoftElement({a: 2})
             else:
@@ -95,6 +103,13 @@ class Profile(Sequence):
             profile.push(element)
         return profile
 
+    @classmethod
+    def fromProbabilities(cls, probabilities):
+        elements = [SoftElement((int(code), row[code])
+                                for code in numpy.flatnonzero(row))
+                    for row in numpy.asarray(probabilities, float)]
+        return cls(elements)
+
     def __init__(self, elements=None):
         if elements is None:
             super(Profile, self).__init__(list())
@@ -104,6 +119,9 @@ class Profile(Sequence):
                     'profile elements must belong to SoftElement class')
             super(Profile, self).__init__(list(elements))
 
+    def probabilities(self, size=None):
+        return probabilityMatrix(self.elements, size)
+
     def key(self):
         return tuple(e.key() for e in self.elements)
 
@@ -139,3 +157,145 @@ class Profile(Sequence):
     def fromDict(cls, d):
         elements = [SoftElement.fromDict(e) for e in d]
         return cls(elements)
+
+
+class CountProfile(object):
+    '''Profile of an encoded sequence stored as an L x V matrix of element
+    counts, with a column for each code.
+
+    Unlike Profile, it does not keep a SoftElement per column: building it
+    from aligned sequences is a single scatter-add, and merging two
+    profiles adds their matrices.
+    '''
+    __slots__ = ('counts',)
+
+    def __init__(self, counts):
+        self.counts = numpy.asarray(counts)
+
+    @classmethod
+    def fromSequences(cls, sequences, size=None):
+        """Counts of the codes in each column of encoded sequences of the
+        same length."""
+        try:
+            codes = numpy.array([numpy.asarray(s[:len(s)], int)
+                                 for s in sequences], int)
+        except ValueError:
+            raise ValueError('sequences with different lengths cannot be '
+                             'counted together')
+        codes = codes.reshape(len(codes), -1) if codes.size \
+            else numpy.zeros((len(codes), 0), int)
+        if size is None:
+            size = int(codes.max()) + 1 if codes.size else 0
+        counts = numpy.zeros((codes.shape[1], size), int)
+        columns = numpy.broadcast_to(numpy.arange(codes.shape[1]),
+                                     codes.shape)
+        numpy.add.at(counts, (columns, codes), 1)
+        return cls(counts)
+
+    @classmethod
+    def fromSequenceAlignment(cls, alignment, size=None):
+        return cls.fromSequences([alignment.first, alignment.second], size)
+
+    @classmethod
+    def fromProfile(cls, profile, size=None):
+        return cls.fromDict(profile.toDict(), size)
+
+    def toProfile(self):
+        return Profile.fromDict(self.toDict())
+
+    def probabilities(self, size=None):
+        totals = self.counts.sum(axis=1, keepdims=True)
+        return self.resized(size).counts / numpy.where(totals, totals, 1)
+
+    def resized(self, size):
+        if size is None or size == self.counts.shape[1]:
+            return self
+        if size < self.counts.shape[1]:
+            raise ValueError('profile has codes outside of the size')
+        return CountProfile(numpy.pad(
+            self.counts, ((0, 0), (0, size - self.counts.shape[1]))))
+
+    def mergeWith(self, other):
+        if len(self) != len(other):
+            raise ValueError(
+                'profiles with different lengths cannot be merged')
+        size = max(self.counts.shape[1], other.counts.shape[1])
+        self.counts = self.resized(size).counts + other.resized(size).counts
+
+    def mergedWith(self, other):
+        merged = CountProfile(self.counts)
+        merged.mergeWith(other)
+        return merged
+
+    def key(self):
+        nonzero = self.counts != 0
+        single = nonzero.sum(axis=1) == 1
+        codes = numpy.argmax(nonzero, axis=1)
+        return tuple(int(c) if s else None
+                     for c, s in zip(codes.tolist(), single.tolist()))
+
+    def toDict(self):
+        rows, codes = numpy.nonzero(self.counts)
+        weights = [dict() for _ in range(len(self))]
+        for i, code, count in zip(rows.tolist(), codes.tolist(),
+                                  self.counts[rows, codes].tolist()):
+            weights[i][code] = count
+        return weights
+
+    @classmethod
+    def fromDict(cls, d, size=None):
+        rows = [i for i, weights in enumerate(d) for _ in weights]
+        codes = numpy.array([c for weights in d for c in weights], int)
+        values = numpy.array([w for weights in d for w in weights.values()])
+        if size is None:
+            size = int(codes.max()) + 1 if len(codes) else 0
+        counts = numpy.zeros((len(d), size),
+                             values.dtype if len(values) else int)
+        counts[rows, codes] = values
+        return cls(counts)
+
+    def __eq__(self, other):
+        size = max(self.counts.shape[1], other.counts.shape[1])
+        return numpy.array_equal(self.resized(size).counts,
+                                 other.resized(size).counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        row = self.counts[item]
+        codes = numpy.flatnonzero(row)
+        return SoftElement(zip(codes.tolist(), row[codes].tolist()))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(self.toDict())
+
+
+def probabilityMatrix(elements, size=None):
+    """Probabilities of the soft elements of an encoded profile as an L x V
+    matrix, with a column for each code. Raises TypeError if the elements
+    are not integer codes."""
+    if isinstance(elements, CountProfile):
+        return elements.probabilities(size)
+    rows = list()
+    codes = list()
+    values = list()
+    for i, element in enumerate(elements):
+        for code, p in iteritems(element.probabilities()):
+            rows.append(i)
+            codes.append(code)
+            values.append(p)
+    codes = numpy.array(codes)
+    if len(codes) and (codes.dtype.kind not in 'iu' or codes.min() < 0):
+        raise TypeError('profile elements are not encoded')
+    if size is None:
+        size = int(codes.max()) + 1 if len(codes) else 0
+    matrix = numpy.zeros((len(elements), size))
+    matrix[rows, codes.astype(int)] = values
+    return matrix
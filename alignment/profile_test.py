@@ -0,0 +1,52 @@
+import numpy
+
+from .vocabulary import Vocabulary
+from .sequence import Sequence
+from .sequencealigner import SimpleScoring
+from .sequencealigner import GlobalSequenceAligner
+from .profile import Profile
+from .profile import CountProfile
+
+
+def test_count_profile_from_alignment():
+    vocab = Vocabulary()
+    first = vocab.encodeSequence(Sequence('what a beautiful day'.split()))
+    second = vocab.encodeSequence(Sequence('what a bad day'.split()))
+    aligner = GlobalSequenceAligner(SimpleScoring(2, -1), -2)
+    score, alignments = aligner.align(first, second, backtrace=True)
+    for alignment in alignments:
+        profile = Profile.fromSequenceAlignment(alignment)
+        counts = CountProfile.fromSequenceAlignment(alignment)
+        assert counts.toDict() == profile.toDict()
+        assert counts.key() == profile.key()
+        assert counts.toProfile().toDict() == profile.toDict()
+        assert CountProfile.fromProfile(profile) == counts
+        assert numpy.allclose(counts.probabilities(len(vocab)),
+                              profile.probabilities(len(vocab)))
+        assert counts[2] == profile[2]
+
+
+def test_count_profile_merge():
+    first = CountProfile.fromSequences([[1, 2, 3], [1, 0, 3]])
+    second = CountProfile.fromSequences([[4, 2, 3]])
+    merged = first.mergedWith(second)
+    assert merged == CountProfile.fromSequences([[1, 2, 3], [1, 0, 3],
+                                                 [4, 2, 3]])
+    assert first.counts.shape == (3, 4)
+    profile = Profile.fromDict(first.toDict())
+    profile.mergeWith(Profile.fromDict(second.toDict()))
+    assert merged.toDict() == profile.toDict()
+    assert not hasattr(merged, '__dict__')
+    try:
+        first.mergeWith(CountProfile.fromSequences([[1, 2]]))
+    except ValueError:
+        pass
+    else:
+        assert False
+    try:
+        CountProfile.fromSequences([[1, 2], [1]])
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert len(CountProfile.fromSequences([])) == 0
@@ -1,16 +1,23 @@
 from six import iteritems
 
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
 from abc import ABCMeta
 
 from .sequence import GAP_CODE
 from .profile import SoftElement
 from .profile import Profile
+from .profile import CountProfile
+from .profile import probabilityMatrix
 from .sequencealigner import Scoring
 from .sequencealigner import SequenceAlignment
 from .sequencealigner import SequenceAligner
 from .sequencealigner import GlobalSequenceAligner
 from .sequencealigner import StrictGlobalSequenceAligner
 from .sequencealigner import LocalSequenceAligner
+from .sequencealigner import elementArray
 
 
 # Scoring ---------------------------------------------------------------------
@@ -19,6 +26,7 @@ class SoftScoring(Scoring):
 
     def __init__(self, scoring):
         self.scoring = scoring
+        self.matrices = dict()
 
     def __call__(self, firstElement, secondElement):
         score = 0.0
@@ -27,6 +35,67 @@ class SoftScoring(Scoring):
                 score += p * q * self.scoring(a, b)
         return score
 
+    def matrix(self, size):
+        # Dense scores of the codes 0..size-1, NaN where a pair is missing.
+        matrix = self.matrices.get(size)
+        if matrix is None:
+            table = getattr(self.scoring, 'table', None)
+            if getattr(self.scoring, 'codes', None) is not None:
+                # The table is not indexed by the codes themselves.
+                table = None
+            matrix = numpy.full((size, size), numpy.nan)
+            if table is not None:
+                k = min(size, len(table))
+                matrix[:k, :k] = table[:k, :k]
+            else:
+                for a, b in numpy.ndindex(size, size):
+                    try:
+                        matrix[a, b] = self.scoring(a, b)
+                    except KeyError:
+                        pass
+            self.matrices[size] = matrix
+        return matrix
+
+    def dense(self, firstElements, secondElements):
+        # P1 @ S and P2 for the probability matrices P1 and P2 of encoded
+        # soft elements, so that P1 @ S @ P2.T are the substitution scores.
+        first = probabilityMatrix(firstElements)
+        second = probabilityMatrix(secondElements)
+        size = max(first.shape[1], second.shape[1])
+        first = numpy.pad(first, ((0, 0), (0, size - first.shape[1])))
+        second = numpy.pad(second, ((0, 0), (0, size - second.shape[1])))
+        matrix = self.matrix(size)
+        a = numpy.flatnonzero(first.any(axis=0))
+        b = numpy.flatnonzero(second.any(axis=0))
+        missing = numpy.isnan(matrix[numpy.ix_(a, b)])
+        if missing.any():
+            i, j = numpy.argwhere(missing)[0]
+            raise KeyError((int(a[i]), int(b[j])))
+        return numpy.dot(first, numpy.nan_to_num(matrix)), second
+
+    def score_rows(self, firstElements, secondElements):
+        try:
+            weighted, second = self.dense(firstElements, secondElements)
+        except TypeError:
+            return super(SoftScoring, self).score_rows(
+                firstElements, secondElements)
+        return numpy.dot(weighted, second.T)
+
+    def score_pairs(self, firstElements, secondElements):
+        try:
+            weighted, second = self.dense(firstElements, secondElements)
+        except TypeError:
+            return super(SoftScoring, self).score_pairs(
+                firstElements, secondElements)
+        return numpy.einsum('ij,ij->i', weighted, second)
+
+
+def profileElements(profile):
+    # Count profiles are scored from their count matrices directly.
+    if isinstance(profile, CountProfile):
+        return profile
+    return elementArray(profile)
+
 
 # Alignment -------------------------------------------------------------------
 
@@ -49,6 +118,25 @@ class ProfileAligner(SequenceAligner):
     def emptyAlignment(self, first, second):
         return ProfileAlignment(Profile(), Profile())
 
+    def substitutionPairs(self, first, second):
+        # With a soft scoring of encoded profiles, the probability matrices
+        # are set up once instead of for every anti-diagonal.
+        if isinstance(self.scoring, SoftScoring):
+            try:
+                weighted, second = self.scoring.dense(profileElements(first),
+                                                      profileElements(second))
+            except TypeError:
+                pass
+            else:
+                def scores(i, j):
+                    return numpy.einsum('ij,ij->i', weighted[i - 1],
+                                        second[j - 1])
+                return scores
+        return super(ProfileAligner, self).substitutionPairs(first, second)
+
+    def makeAlignment(self, first, second, columns):
+        return self.buildAlignment(first, second, columns)
+
 
 class GlobalProfileAligner(ProfileAligner, GlobalSequenceAligner):
     pass
@@ -0,0 +1,114 @@
+import random
+
+import numpy
+
+from .profile import Profile
+from .profile import CountProfile
+from .profile import SoftElement
+from .sequencealigner import SimpleScoring
+from .sequencealigner import MatrixScoring
+from .profilealigner import SoftScoring
+from .profilealigner import GlobalProfileAligner
+from .profilealigner import StrictGlobalProfileAligner
+from .profilealigner import LocalProfileAligner
+from .pairwise import pairwise_matrix
+
+
+def randomprofile(length, size):
+    return Profile([SoftElement(dict((random.randrange(1, size),
+                                      random.randint(1, 3))
+                                     for _ in range(random.randint(1, 3))))
+                    for _ in range(length)])
+
+
+def test_probabilities():
+    profile = Profile([SoftElement({1: 1, 3: 3}), SoftElement({2: 2})])
+    matrix = profile.probabilities()
+    assert matrix.tolist() == [[0, 0.25, 0, 0.75], [0, 0, 1, 0]]
+    assert profile.probabilities(6).shape == (2, 6)
+    assert Profile.fromProbabilities(matrix).probabilities().tolist() == \
+        matrix.tolist()
+    try:
+        Profile.fromSequence('ab').probabilities()
+    except TypeError:
+        pass
+    else:
+        assert False
+
+
+def test_soft_scoring_matches_loop():
+    random.seed(3)
+    matrix = dict(((a, b), random.randint(-3, 3))
+                  for a in range(1, 6) for b in range(a, 6))
+    for scoring in (SimpleScoring(2, -1), MatrixScoring(matrix)):
+        soft = SoftScoring(scoring)
+        first = randomprofile(7, 6)
+        second = randomprofile(5, 6)
+        rows = soft.score_rows(first.elements, second.elements)
+        for i, a in enumerate(first):
+            for j, b in enumerate(second):
+                assert abs(rows[i, j] - soft(a, b)) < 1e-9
+        pairs = soft.score_pairs(first.elements[:5], second.elements)
+        assert numpy.allclose(pairs, rows.diagonal())
+        for cls in (GlobalProfileAligner, StrictGlobalProfileAligner,
+                    LocalProfileAligner):
+            aligner = cls(soft, -1)
+            score, alignments = aligner.align(first, second, backtrace=True)
+            assert abs(aligner.align(first, second) - score) < 1e-9
+            assert abs(alignments[0].score - score) < 1e-9
+
+
+def test_soft_scoring_missing_pair():
+    soft = SoftScoring(MatrixScoring({(1, 1): 1, (2, 2): 1}))
+    try:
+        soft.score_rows([SoftElement({1: 1})], [SoftElement({2: 1})])
+    except KeyError:
+        pass
+    else:
+        assert False
+
+
+def test_align_many_profiles():
+    random.seed(5)
+    soft = SoftScoring(SimpleScoring(2, -1))
+    target = randomprofile(6, 5)
+    candidates = [randomprofile(random.randint(0, 8), 5) for _ in range(10)]
+    for cls in (GlobalProfileAligner, StrictGlobalProfileAligner,
+                LocalProfileAligner):
+        aligner = cls(soft, -1)
+        expected = [aligner.align(target, c) for c in candidates]
+        assert numpy.allclose(aligner.align_many(target, candidates),
+                              expected)
+        matches = aligner.best_matches(target, candidates, k=3)
+        assert numpy.allclose([score for _, score in matches],
+                              sorted(expected, reverse=True)[:3])
+        for index, score in matches:
+            assert abs(expected[index] - score) < 1e-9
+        scores = pairwise_matrix(candidates[:4], aligner, workers=1)
+        assert numpy.allclose(scores, [[aligner.align(a, b)
+                                        for b in candidates[:4]]
+                                       for a in candidates[:4]])
+
+
+def test_align_count_profiles():
+    random.seed(7)
+    soft = SoftScoring(SimpleScoring(2, -1))
+    first = CountProfile.fromSequences(
+        [[random.randrange(1, 5) for _ in range(9)] for _ in range(4)])
+    second = CountProfile.fromSequences(
+        [[random.randrange(1, 5) for _ in range(6)] for _ in range(3)])
+    assert first[1:3] == [first[1], first[2]]
+    assert list(first) == first[:]
+    for cls in (GlobalProfileAligner, StrictGlobalProfileAligner,
+                LocalProfileAligner):
+        aligner = cls(soft, -1)
+        expected = aligner.align(first.toProfile(), second.toProfile(),
+                                 backtrace=True)
+        score, alignments = aligner.align(first, second, backtrace=True)
+        assert abs(score - expected[0]) < 1e-9
+        assert abs(aligner.align(first, second) - score) < 1e-9
+        assert abs(alignments[0].score - score) < 1e-9
+        assert [str(a) for a in alignments] == \
+            [str(a) for a in expected[1]]
+        assert numpy.allclose(aligner.align_many(first, [second, first]),
+                              [score, aligner.align(first, first)])
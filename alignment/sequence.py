@@ -84,21 +84,31 @@ class Sequence(BaseSequence):
         return self.elements.pop()
 
 
+def codetype(size):
+    """Smallest unsigned integer dtype that holds the codes 0..size-1."""
+    return numpy.min_scalar_type(max(size - 1, 0))
+
+
 class EncodedSequence(BaseSequence):
 
-    def __init__(self, argument, id=None):
+    def __init__(self, argument, id=None, dtype=None):
+        # Elements are stored as int unless a dtype is given, e.g. by the
+        # vocabulary, or an integer array is passed.
+        integers = isinstance(argument, numpy.ndarray) \
+            and argument.dtype.kind in 'iu'
+        if dtype is None:
+            dtype = argument.dtype if integers else int
         if isinstance(argument, int):
             super(EncodedSequence, self).__init__(
-                numpy.zeros(argument, int), id)
+                numpy.zeros(argument, dtype), id)
             self.position = 0
         else:
-            if isinstance(argument, numpy.ndarray) \
-                    and argument.dtype.name.startswith('int'):
+            if integers:
                 super(EncodedSequence, self).__init__(
-                    numpy.array(argument), id)
+                    numpy.array(argument, dtype), id)
             else:
                 super(EncodedSequence, self).__init__(
-                    numpy.array(list(argument), int), id)
+                    numpy.array(list(argument), dtype), id)
             self.position = len(self.elements)
 
     def push(self, element):
@@ -110,7 +120,10 @@ class EncodedSequence(BaseSequence):
         return int(self.elements[self.position])
 
     def key(self):
-        return tuple(int(e) for e in self.elements[:self.position])
+        # The raw bytes are much cheaper to build and hash than a tuple of
+        # ints. They are taken in a fixed dtype, so that the same codes give
+        # the same key however compactly they are stored.
+        return self.elements[:self.position].astype(numpy.int64).tobytes()
 
     def reversed(self):
         return EncodedSequence(
@@ -118,6 +131,15 @@ class EncodedSequence(BaseSequence):
             id=self.id,
         )
 
+    def __eq__(self, other):
+        if self.id is None or other.id is None:
+            return numpy.array_equal(self.elements[:self.position],
+                                     other[:len(other)])
+        else:
+            return self.id == other.id
+
+    __hash__ = BaseSequence.__hash__
+
     def __len__(self):
         return self.position
 
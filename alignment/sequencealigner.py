@@ -1,3 +1,4 @@
+from six import iteritems
 from six import text_type
 from six.moves import range
 
@@ -5,11 +6,13 @@ try:
     import numpypy as numpy
 except ImportError:
     import numpy
+import heapq
 from abc import ABCMeta
 from abc import abstractmethod
 
 from .sequence import GAP_CODE
 from .sequence import EncodedSequence
+from . import wavefront
 
 
 # Scoring ---------------------------------------------------------------------
@@ -21,6 +24,31 @@ class Scoring(object):
     def __call__(self, firstElement, secondElement):
         return 0
 
+    def score_rows(self, firstElements, secondElements):
+        # Substitution scores of every element of the first sequence against
+        # every element of the second one.
+        scores = numpy.zeros((len(firstElements), len(secondElements)))
+        for i, a in enumerate(firstElements):
+            for j, b in enumerate(secondElements):
+                scores[i, j] = self(a, b)
+        return scores
+
+    def score_pairs(self, firstElements, secondElements):
+        # Substitution scores of the element pairs at the same positions.
+        return numpy.array([self(a, b) for a, b
+                            in zip(firstElements, secondElements)], float)
+
+    def pair_scores(self, firstElements, secondElements):
+        # Function returning the substitution scores of the element pairs
+        # (firstElements[i], secondElements[j]) given arrays i and j.
+        def scores(i, j):
+            return self.score_pairs(firstElements[i], secondElements[j])
+        return scores
+
+    def isSymmetric(self):
+        # Whether scores stay the same when the elements are swapped.
+        return False
+
 
 class SimpleScoring(Scoring):
 
@@ -34,23 +62,198 @@ class SimpleScoring(Scoring):
         else:
             return self.mismatchScore
 
+    def score_rows(self, firstElements, secondElements):
+        first = numpy.asarray(firstElements)
+        second = numpy.asarray(secondElements)
+        return numpy.where(first[:, None] == second[None, :],
+                           float(self.matchScore),
+                           float(self.mismatchScore))
+
+    def score_pairs(self, firstElements, secondElements):
+        return numpy.where(
+            numpy.asarray(firstElements) == numpy.asarray(secondElements),
+            float(self.matchScore), float(self.mismatchScore))
+
+    def isSymmetric(self):
+        return True
+
 
 class MatrixScoring(Scoring):
 
     def __init__(self, subMat):
         self.subMat = subMat
+        self.codes, self.table = self.compile(subMat)
+
+    @staticmethod
+    def compile(subMat):
+        # Dense symmetric table of the scores, with NaN for missing pairs.
+        # It is indexed by the element codes themselves unless these are
+        # sparse, in which case codes holds the sorted codes that index it.
+        # Returns (None, None) if the matrix is not keyed by codes.
+        codes = [c for k in subMat for c in k]
+        if not all(isinstance(c, (int, numpy.integer)) for c in codes):
+            return None, None
+        if any(c < 0 for c in codes):
+            return None, None
+        codes = numpy.unique(numpy.array(codes, int))
+        pairs = numpy.array(list(subMat), int).reshape(-1, 2)
+        scores = numpy.array(list(subMat.values()), float)
+        if not len(codes) or codes[-1] < 2 * len(codes) + 256:
+            size = codes[-1] + 1 if len(codes) else 0
+            codes = None
+        else:
+            size = len(codes)
+            pairs = numpy.searchsorted(codes, pairs)
+        table = numpy.full((size, size), numpy.nan)
+        table[pairs[:, 1], pairs[:, 0]] = scores
+        table[pairs[:, 0], pairs[:, 1]] = scores
+        return codes, table
 
     def __call__(self, firstElement, secondElement):
-        try:
-            score = self.subMat[(firstElement, secondElement)]
-        except KeyError:
-            score = self.subMat[(secondElement, firstElement)]
+        if self.table is None:
+            try:
+                return self.subMat[(firstElement, secondElement)]
+            except KeyError:
+                return self.subMat[(secondElement, firstElement)]
+        if self.codes is None:
+            try:
+                score = self.table[firstElement, secondElement]
+            except IndexError:
+                score = numpy.nan
+        else:
+            try:
+                first, second = self.indices(
+                    numpy.array([firstElement, secondElement]))
+            except KeyError:
+                score = numpy.nan
+            else:
+                score = self.table[first, second]
+        if numpy.isnan(score):
+            raise KeyError((firstElement, secondElement))
         return score
 
+    def score_rows(self, firstElements, secondElements):
+        if self.table is None:
+            return super(MatrixScoring, self).score_rows(
+                firstElements, secondElements)
+        first = numpy.asarray(firstElements, dtype=int)
+        second = numpy.asarray(secondElements, dtype=int)
+        return self.lookup(first[:, None], second[None, :])
+
+    def score_pairs(self, firstElements, secondElements):
+        if self.table is None:
+            return super(MatrixScoring, self).score_pairs(
+                firstElements, secondElements)
+        return self.lookup(numpy.asarray(firstElements, dtype=int),
+                           numpy.asarray(secondElements, dtype=int))
+
+    def pair_scores(self, firstElements, secondElements):
+        if self.table is None:
+            return super(MatrixScoring, self).pair_scores(
+                firstElements, secondElements)
+        first = numpy.asarray(firstElements, dtype=int)
+        second = numpy.asarray(secondElements, dtype=int)
+        rows = self.indices(first)
+        cols = self.indices(second)
+        if numpy.isnan(self.table[numpy.ix_(numpy.unique(rows),
+                                            numpy.unique(cols))]).any():
+            # Only pairs that are actually scored may raise.
+            return super(MatrixScoring, self).pair_scores(first, second)
+        table = self.table
+
+        def scores(i, j):
+            return table[rows[i], cols[j]]
+        return scores
+
+    def isSymmetric(self):
+        return all(self.subMat.get((b, a), score) == score
+                   for (a, b), score in iteritems(self.subMat))
+
+    def indices(self, elements):
+        # Indices of the table rows of the element codes.
+        if self.codes is None:
+            if (elements >= len(self.table)).any():
+                raise KeyError('element codes outside of the substitution '
+                               'matrix')
+            return elements
+        indices = numpy.searchsorted(self.codes, elements)
+        indices = numpy.minimum(indices, len(self.codes) - 1)
+        if (self.codes[indices] != elements).any():
+            raise KeyError('element codes outside of the substitution '
+                           'matrix')
+        return indices
+
+    def lookup(self, first, second):
+        scores = self.table[self.indices(first), self.indices(second)]
+        if numpy.isnan(scores).any():
+            index = tuple(numpy.argwhere(numpy.isnan(scores))[0])
+            first, second = numpy.broadcast_arrays(first, second)
+            raise KeyError((int(first[index]), int(second[index])))
+        return scores
+
 
 # Alignment -------------------------------------------------------------------
 
-class SequenceAlignment(object):
+class BaseAlignment(object):
+    # Statistics and formatting shared by the alignment types, given first,
+    # second, gap, score, identicalCount, similarCount and gapCount.
+    __slots__ = ()
+
+    def key(self):
+        return self.first.key(), self.second.key()
+
+    def percentIdentity(self):
+        try:
+            return float(self.identicalCount) / len(self) * 100.0
+        except ZeroDivisionError:
+            return 0.0
+
+    def percentSimilarity(self):
+        try:
+            return float(self.similarCount) / len(self) * 100.0
+        except ZeroDivisionError:
+            return 0.0
+
+    def percentGap(self):
+        try:
+            return float(self.gapCount) / len(self) * 100.0
+        except ZeroDivisionError:
+            return 0.0
+
+    def quality(self):
+        return self.score, \
+            self.percentIdentity(), \
+            self.percentSimilarity(), \
+            -self.percentGap()
+
+    def __getitem__(self, item):
+        return self.first[item], self.second[item]
+
+    def __repr__(self):
+        return repr((self.first, self.second))
+
+    def __str__(self):
+        first = [str(e) for e in self.first.elements]
+        second = [str(e) for e in self.second.elements]
+        for i in range(len(first)):
+            n = max(len(first[i]), len(second[i]))
+            format = '%-' + str(n) + 's'
+            first[i] = format % first[i]
+            second[i] = format % second[i]
+        return '%s\n%s' % (' '.join(first), ' '.join(second))
+
+    def __unicode__(self):
+        first = [text_type(e) for e in self.first.elements]
+        second = [text_type(e) for e in self.second.elements]
+        for i in range(len(first)):
+            n = max(len(first[i]), len(second[i]))
+            format = u'%-' + text_type(n) + u's'
+            first[i] = format % first[i]
+            second[i] = format % second[i]
+        return u'%s\n%s' % (u' '.join(first), u' '.join(second))
+
+
+class SequenceAlignment(BaseAlignment):
 
     def __init__(self, first, second, gap=GAP_CODE, other=None):
         self.first = first
@@ -95,105 +298,596 @@ class SequenceAlignment(object):
             self.gapCount -= 1
         return firstElement, secondElement
 
-    def key(self):
-        return self.first.key(), self.second.key()
-
     def reversed(self):
         first = self.first.reversed()
         second = self.second.reversed()
         return type(self)(first, second, self.gap, self)
 
-    def percentIdentity(self):
-        try:
-            return float(self.identicalCount) / len(self) * 100.0
-        except ZeroDivisionError:
-            return 0.0
-
-    def percentSimilarity(self):
-        try:
-            return float(self.similarCount) / len(self) * 100.0
-        except ZeroDivisionError:
-            return 0.0
+    def __len__(self):
+        assert len(self.first) == len(self.second)
+        return len(self.first)
 
-    def percentGap(self):
-        try:
-            return float(self.gapCount) / len(self) * 100.0
-        except ZeroDivisionError:
-            return 0.0
 
-    def quality(self):
-        return self.score, \
-            self.percentIdentity(), \
-            self.percentSimilarity(), \
-            -self.percentGap()
+class AlignmentPath(BaseAlignment):
+    '''Compact alignment of two encoded sequences.
+
+    Only the path is stored: one uint8 move per column (wavefront.MATCH,
+    GAP_FIRST or GAP_SECOND) and the cell it starts from. The aligned
+    sequences, the column scores and the statistics are computed from the
+    original sequences when asked for.
+    '''
+    __slots__ = ('sequences', 'ops', 'start', 'score', 'aligner', 'path')
+    gap = GAP_CODE
+    opChars = {wavefront.MATCH: 'M', wavefront.GAP_FIRST: 'I',
+               wavefront.GAP_SECOND: 'D'}
+
+    def __init__(self, first, second, ops, start, score, aligner):
+        self.sequences = (first, second)
+        self.ops = numpy.asarray(ops, numpy.uint8)
+        self.start = start
+        self.score = score
+        self.aligner = aligner
+        self.path = None
+
+    def opstring(self):
+        '''The moves as a string of M (match or mismatch), I (gap in the
+        first sequence) and D (gap in the second sequence).'''
+        return ''.join(self.opChars[op] for op in self.ops.tolist())
+
+    def cells(self):
+        # Cells (i, j) of the alignment matrix entered by the moves,
+        # computed on first use.
+        if self.path is None:
+            i = self.start[0] + numpy.cumsum(
+                (self.ops & (wavefront.MATCH | wavefront.GAP_SECOND)) != 0)
+            j = self.start[1] + numpy.cumsum(
+                (self.ops & (wavefront.MATCH | wavefront.GAP_FIRST)) != 0)
+            self.path = (i, j)
+        return self.path
+
+    def aligned(self, k):
+        sequence = self.sequences[k]
+        elements = elementArray(sequence)
+        used = wavefront.GAP_SECOND if k == 0 else wavefront.GAP_FIRST
+        used = (self.ops & (wavefront.MATCH | used)) != 0
+        aligned = numpy.full(len(self.ops), self.gap, elements.dtype)
+        aligned[used] = elements[self.cells()[k][used] - 1]
+        return EncodedSequence(aligned, id=sequence.id)
+
+    @property
+    def first(self):
+        return self.aligned(0)
+
+    @property
+    def second(self):
+        return self.aligned(1)
+
+    @property
+    def scores(self):
+        first, second = self.sequences
+        i, j = self.cells()
+        m = len(first) + 1
+        n = len(second) + 1
+        rowGaps, colGaps = self.aligner.gapScores(m, n)
+        scores = numpy.where(self.ops == wavefront.GAP_FIRST,
+                             rowGaps[i], colGaps[j])
+        match = self.ops == wavefront.MATCH
+        if match.any():
+            scores[match] = self.aligner.scoring.score_pairs(
+                elementArray(first)[i[match] - 1],
+                elementArray(second)[j[match] - 1])
+        return scores
+
+    @property
+    def identicalCount(self):
+        i, j = self.cells()
+        match = self.ops == wavefront.MATCH
+        return int((elementArray(self.sequences[0])[i[match] - 1]
+                    == elementArray(self.sequences[1])[j[match] - 1]).sum())
+
+    @property
+    def similarCount(self):
+        return int((self.scores > 0).sum())
+
+    @property
+    def gapCount(self):
+        return int((self.ops != wavefront.MATCH).sum())
 
     def __len__(self):
-        assert len(self.first) == len(self.second)
-        return len(self.first)
+        return len(self.ops)
 
-    def __getitem__(self, item):
-        return self.first[item], self.second[item]
 
-    def __repr__(self):
-        return repr((self.first, self.second))
+# Aligner ---------------------------------------------------------------------
 
-    def __str__(self):
-        first = [str(e) for e in self.first.elements]
-        second = [str(e) for e in self.second.elements]
-        for i in range(len(first)):
-            n = max(len(first[i]), len(second[i]))
-            format = '%-' + str(n) + 's'
-            first[i] = format % first[i]
-            second[i] = format % second[i]
-        return '%s\n%s' % (' '.join(first), ' '.join(second))
+def elementArray(sequence):
+    # Elements of a sequence as an array that supports fancy indexing.
+    elements = sequence[:len(sequence)]
+    if isinstance(elements, numpy.ndarray):
+        return elements
+    array = numpy.empty(len(elements), object)
+    for i, e in enumerate(elements):
+        array[i] = e
+    return array
+
+
+def candidateCodes(candidates, length):
+    # Distinct elements of the candidates, and the candidates as rows of
+    # indices into them padded to the given length.
+    arrays = [elementArray(c) for c in candidates]
+    codes = numpy.zeros((len(arrays), length), int)
+    try:
+        elements, inverse = numpy.unique(numpy.concatenate(arrays),
+                                         return_inverse=True)
+    except TypeError:
+        try:
+            index = dict()
+            inverse = [index.setdefault(e, len(index))
+                       for array in arrays for e in array]
+        except TypeError:
+            # Elements that cannot be hashed, like soft elements, are all
+            # taken as distinct.
+            elements = numpy.concatenate(arrays) if arrays else \
+                numpy.zeros(0, object)
+            inverse = numpy.arange(len(elements))
+        else:
+            elements = numpy.empty(len(index), object)
+            for e, k in iteritems(index):
+                elements[k] = e
+    start = 0
+    for k, array in enumerate(arrays):
+        codes[k, :len(array)] = numpy.ravel(inverse)[start:start + len(array)]
+        start += len(array)
+    return elements, codes
 
-    def __unicode__(self):
-        first = [text_type(e) for e in self.first.elements]
-        second = [text_type(e) for e in self.second.elements]
-        for i in range(len(first)):
-            n = max(len(first[i]), len(second[i]))
-            format = u'%-' + text_type(n) + u's'
-            first[i] = format % first[i]
-            second[i] = format % second[i]
-        return u'%s\n%s' % (u' '.join(first), u' '.join(second))
 
+def largestSums(values, count):
+    # Sums of the 0, 1, ..., count - 1 largest values along the last axis.
+    values = -numpy.sort(-values, axis=-1)
+    zeros = numpy.zeros(values.shape[:-1] + (1,))
+    return numpy.concatenate(
+        (zeros, numpy.cumsum(values, axis=-1)), axis=-1)[..., :count]
 
-# Aligner ---------------------------------------------------------------------
 
 class SequenceAligner(object):
     __metaclass__ = ABCMeta
+    floorScore = None
+    # Order in which tied moves are preferred when recovering one alignment.
+    moveOrder = (wavefront.MATCH, wavefront.GAP_FIRST, wavefront.GAP_SECOND)
+    # Whether linearBacktrace() can recover an alignment.
+    linearSpace = True
 
     def __init__(self, scoring, gapScore):
         self.scoring = scoring
         self.gapScore = gapScore
 
-    def align(self, first, second, backtrace=False):
-        f = self.computeAlignmentMatrix(first, second)
+    def align(self, first, second, backtrace=False, linear_space=False):
+        if not backtrace:
+            return self.computeBestScore(first, second)
+        if linear_space:
+            if not self.linearSpace:
+                raise ValueError(
+                    'linear space backtrace is not supported by %s'
+                    % type(self).__name__)
+            if backtrace != 'one':
+                raise ValueError(
+                    'linear space backtrace recovers only one alignment')
+            score = self.computeBestScore(first, second)
+            return score, [self.linearBacktrace(first, second)]
+        f, trace = self.computeTracebackMatrix(first, second)
         score = self.bestScore(f)
-        if backtrace:
-            alignments = self.backtrace(first, second, f)
-            return score, alignments
+        alignments = list(self.iterBacktrace(
+            first, second, f, trace, 1 if backtrace == 'one' else None))
+        return score, alignments
+
+    def isSymmetric(self):
+        # Whether swapping the sequences leaves the score unchanged.
+        return self.scoring.isSymmetric()
+
+    def makeAlignment(self, first, second, columns):
+        # Alignment of the columns, given as (move, i, j, score) with the
+        # cell (i, j) each move enters, in order.
+        if columns:
+            move, i, j, score = columns[0]
+            start = (i - (move != wavefront.GAP_FIRST),
+                     j - (move != wavefront.GAP_SECOND))
         else:
-            return score
+            start = (0, 0)
+        return AlignmentPath(first, second, [c[0] for c in columns], start,
+                             sum(c[3] for c in columns), self)
+
+    def buildAlignment(self, first, second, columns):
+        # Alignment of the columns, pushed element by element onto
+        # emptyAlignment().
+        alignment = self.emptyAlignment(first, second)
+        for move, i, j, score in columns:
+            if move == wavefront.MATCH:
+                alignment.push(first[i - 1], second[j - 1], score)
+            elif move == wavefront.GAP_FIRST:
+                alignment.push(alignment.gap, second[j - 1], score)
+            else:
+                alignment.push(first[i - 1], alignment.gap, score)
+        return alignment
 
     def emptyAlignment(self, first, second):
-        # Pre-allocate sequences.
+        # Pre-allocate sequences, in the dtype of the encoded ones.
+        dtype = numpy.result_type(first.elements, second.elements)
         return SequenceAlignment(
-            EncodedSequence(len(first) + len(second), id=first.id),
-            EncodedSequence(len(first) + len(second), id=second.id),
+            EncodedSequence(len(first) + len(second), id=first.id,
+                            dtype=dtype),
+            EncodedSequence(len(first) + len(second), id=second.id,
+                            dtype=dtype),
         )
 
-    @abstractmethod
+    def substitutionScores(self, first, second):
+        return self.scoring.score_rows(first[:len(first)],
+                                       second[:len(second)])
+
     def computeAlignmentMatrix(self, first, second):
-        return numpy.zeros(0)
+        m = len(first) + 1
+        n = len(second) + 1
+        f = numpy.zeros((m, n))
+        rowGaps, colGaps = self.gapScores(m, n)
+        wavefront.boundary(f, rowGaps, colGaps, self.floorScore)
+        wavefront.fill(f, self.substitutionScores(first, second),
+                       rowGaps, colGaps, self.floorScore)
+        return f
+
+    def computeBestScore(self, first, second):
+        # Same as bestScore(computeAlignmentMatrix(first, second)). Matrices
+        # larger than a block are swept in linear memory instead.
+        if (len(first) + 1) * (len(second) + 1) <= wavefront.BLOCK_SIZE:
+            return self.bestScore(self.computeAlignmentMatrix(first, second))
+        return self.sweepScore(first, second)
+
+    def sweepScore(self, first, second, band=None):
+        m = len(first) + 1
+        n = len(second) + 1
+        rowGaps, colGaps = self.gapScores(m, n)
+        return wavefront.lastCell(m, n, self.substitutionPairs(first, second),
+                                  rowGaps, colGaps, self.floorScore, band)
+
+    def sweep(self, first, second):
+        m = len(first) + 1
+        n = len(second) + 1
+        rowGaps, colGaps = self.gapScores(m, n)
+        return wavefront.sweep(m, n, self.substitutionPairs(first, second),
+                               rowGaps, colGaps, self.floorScore)
+
+    def align_many(self, target, candidates):
+        '''Best scores of aligning target with each of the candidates, in
+        candidate order.'''
+        return self.sweepMany(target, candidates)[0]
+
+    def best_matches(self, target, candidates, k=1, batchSize=64):
+        '''Indices and scores of the k candidates that align best with
+        target, best first. Ties go to the earlier candidate.
+
+        Candidates are scored in batches, in decreasing order of an upper
+        bound of their scores, until no remaining bound can beat the k-th
+        best score.
+        '''
+        if k <= 0:
+            return []
+        candidates = list(candidates)
+        bounds = self.scoreBounds(target, candidates)
+        order = numpy.lexsort((numpy.arange(len(candidates)), -bounds))
+        heap = list()
+        start = 0
+        while start < len(order):
+            batch = order[start:start + batchSize]
+            if len(heap) == k:
+                # Candidates that can at best tie with the k-th best one
+                # lose to it if they come later.
+                kthScore, kthIndex = heap[0][0], -heap[0][1]
+                batch = batch[(bounds[batch] > kthScore) |
+                              ((bounds[batch] == kthScore) &
+                               (batch < kthIndex))]
+                if not len(batch):
+                    break
+            scores = self.align_many(target, [candidates[i] for i in batch])
+            for index, score in zip(batch, scores):
+                item = (score, -int(index))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+            start += batchSize
+        return [(-index, score) for score, index in sorted(heap, reverse=True)]
+
+    def scoreBounds(self, target, candidates):
+        # Upper bounds of the scores of target against each candidate.
+        if not len(candidates):
+            return numpy.zeros(0)
+        bounds = self.matchBounds(target, candidates).max(1)
+        # Allow for rounding errors of the alignment scores.
+        return bounds + 1e-9 * (1 + numpy.abs(bounds))
+
+    def matchBounds(self, target, candidates):
+        # Upper bounds of the scores of target against each candidate with
+        # 0, 1, ... substitutions, -inf past the length of the shorter
+        # sequence. With a given number of substitutions, those take at most
+        # the best substitution scores of as many elements of either
+        # sequence.
+        m = len(target)
+        lengths = numpy.array([len(c) for c in candidates], int)
+        n = lengths.max()
+        elements, codes = candidateCodes(candidates, n)
+        rows = self.scoring.score_rows(elementArray(target), elements)
+        matches = numpy.arange(min(m, n) + 1)
+        sums = numpy.zeros((len(lengths), len(matches)))
+        if m and n:
+            # Best substitution scores of the elements of the target against
+            # each candidate, and of those of the candidates against the
+            # target.
+            rowBest = numpy.full((len(lengths), m), -numpy.inf)
+            size = len(elements)
+            step = max(1, wavefront.BLOCK_SIZE // (m * min(n, size)))
+            for start in range(0, len(lengths), step):
+                stop = start + step
+                # Distinct elements of each candidate, by candidate.
+                chunk = codes[start:stop]
+                pairs = numpy.unique((numpy.arange(len(chunk))[:, None] * size
+                                      + chunk)[numpy.arange(n)
+                                               < lengths[start:stop, None]])
+                firsts = numpy.flatnonzero(numpy.diff(pairs // size,
+                                                      prepend=-1))
+                rowBest[start + pairs[firsts] // size] = \
+                    numpy.maximum.reduceat(rows[:, pairs % size].T, firsts)
+            colBest = numpy.where(numpy.arange(n) < lengths[:, None],
+                                  rows.max(0)[codes], -numpy.inf)
+            sums = numpy.minimum(largestSums(rowBest, len(matches)),
+                                 largestSums(colBest, len(matches)))
+        return numpy.where(
+            matches <= numpy.minimum(m, lengths)[:, None],
+            sums + self.gapScoreBound(m, lengths[:, None], matches),
+            -numpy.inf)
+
+    def gapScoreBound(self, m, n, matches):
+        # Upper bound of the total gap score of aligning sequences of
+        # lengths m and n with the given numbers of substitutions.
+        return max(0.0, self.gapScore) * (m + n - 2 * matches)
+
+    def sweepMany(self, target, candidates, band=None):
+        # Last cells and maxima of the matrices of target against each of
+        # the candidates, optionally within the bands of wavefront.band().
+        candidates = list(candidates)
+        if not candidates:
+            return numpy.zeros(0), numpy.zeros(0)
+        return wavefront.sweepMany(*self.batchMatrices(target, candidates),
+                                   floor=self.floorScore, band=band)
+
+    def batchMatrices(self, target, candidates):
+        # Arguments of the batched wavefront sweeps of target against the
+        # candidates: m, lengths, scores, rowGaps and colGaps.
+        m = len(target) + 1
+        lengths = numpy.array([len(c) + 1 for c in candidates], int)
+        n = lengths.max()
+        rowGaps = self.gapScores(m, n)[0]
+        colGaps = numpy.zeros((len(lengths), n))
+        for k, length in enumerate(lengths):
+            colGaps[k, :length] = self.gapScores(m, length)[1]
+
+        # Substitution scores of the target against the distinct elements
+        # of the candidates, and the candidates as indices into them.
+        elements, codes = candidateCodes(candidates, n - 1)
+        rows = self.scoring.score_rows(elementArray(target), elements)
+
+        def scores(i, j):
+            return rows[i - 1, codes[:, j - 1]]
+        return m, lengths, scores, rowGaps, colGaps
+
+    def substitutionPairs(self, first, second):
+        scores = self.scoring.pair_scores(elementArray(first),
+                                          elementArray(second))
+        return lambda i, j: scores(i - 1, j - 1)
+
+    def gapScores(self, m, n):
+        # Score of a gap on the first sequence in each row and of a gap on
+        # the second sequence in each column.
+        return numpy.full(m, float(self.gapScore)), \
+            numpy.full(n, float(self.gapScore))
+
+    def isEndGap(self, move, i, j, m, n):
+        # Whether the move into cell (i, j) is left out of alignments.
+        return False
+
+    def linearBacktrace(self, first, second):
+        # Recover one optimal alignment in linear space, dividing the matrix
+        # at its middle row as in Hirschberg's algorithm.
+        m = len(first) + 1
+        n = len(second) + 1
+        rowGaps, colGaps = self.gapScores(m, n)
+        moves = list()
+        self.divideAndConquer(elementArray(first), elementArray(second),
+                              rowGaps, colGaps, 0, m - 1, 0, n - 1, moves)
+        return self.makeAlignment(
+            first, second, [(move, i, j, score) for move, i, j, score in moves
+                            if not self.isEndGap(move, i, j, m, n)])
+
+    def divideAndConquer(self, first, second, rowGaps, colGaps,
+                         i0, i1, j0, j1, moves):
+        h = i1 - i0 + 1
+        w = j1 - j0 + 1
+        if h < 3 or w < 3 or h * w <= wavefront.BLOCK_SIZE:
+            self.backtraceBlock(first, second, rowGaps, colGaps,
+                                i0, i1, j0, j1, moves)
+            return
+        mid = (i0 + i1) // 2
+
+        def forwardScores(i, j):
+            return self.scoring.score_pairs(first[i0 + i - 1],
+                                            second[j0 + j - 1])
+
+        def backwardScores(i, j):
+            return self.scoring.score_pairs(first[i1 - i],
+                                            second[j1 - j])
+
+        forward = wavefront.lastRow(
+            mid - i0 + 1, w, forwardScores,
+            rowGaps[i0:mid + 1], colGaps[j0:j1 + 1])
+        backward = wavefront.lastRow(
+            i1 - mid + 1, w, backwardScores,
+            rowGaps[mid:i1 + 1][::-1], colGaps[j0:j1 + 1][::-1])
+        j = j0 + int(numpy.argmax(forward + backward[::-1]))
+        self.divideAndConquer(first, second, rowGaps, colGaps,
+                              i0, mid, j0, j, moves)
+        self.divideAndConquer(first, second, rowGaps, colGaps,
+                              mid, i1, j, j1, moves)
+
+    def backtraceBlock(self, first, second, rowGaps, colGaps,
+                       i0, i1, j0, j1, moves):
+        # Solve a small block with a full matrix and append the moves of one
+        # optimal path from (i0, j0) to (i1, j1).
+        rows = rowGaps[i0:i1 + 1]
+        cols = colGaps[j0:j1 + 1]
+        f = numpy.zeros((i1 - i0 + 1, j1 - j0 + 1))
+        trace = numpy.zeros(f.shape, numpy.uint8)
+        s = self.scoring.score_rows(first[i0:i1], second[j0:j1])
+        wavefront.boundary(f, rows, cols, trace=trace)
+        wavefront.fill(f, s, rows, cols, trace=trace)
+        path = list()
+        i, j = i1 - i0, j1 - j0
+        while i > 0 or j > 0:
+            move = self.tracebackMoves(trace[i, j])[0]
+            if move == wavefront.MATCH:
+                path.append((move, i0 + i, j0 + j, s[i - 1, j - 1]))
+                i, j = i - 1, j - 1
+            elif move == wavefront.GAP_FIRST:
+                path.append((move, i0 + i, j0 + j, rows[i]))
+                j -= 1
+            else:
+                path.append((move, i0 + i, j0 + j, cols[j]))
+                i -= 1
+        moves.extend(reversed(path))
+
+    def computeTracebackMatrix(self, first, second):
+        # Alignment matrix together with its traceback matrix.
+        m = len(first) + 1
+        n = len(second) + 1
+        f = numpy.zeros((m, n))
+        trace = numpy.zeros((m, n), numpy.uint8)
+        rowGaps, colGaps = self.gapScores(m, n)
+        wavefront.boundary(f, rowGaps, colGaps, self.floorScore, trace)
+        wavefront.fill(f, self.substitutionScores(first, second),
+                       rowGaps, colGaps, self.floorScore, trace)
+        return f, trace
+
+    def tracebackMatrix(self, first, second, f):
+        # Traceback matrix of an already computed alignment matrix.
+        m, n = f.shape
+        rowGaps, colGaps = self.gapScores(m, n)
+        trace = numpy.zeros((m, n), numpy.uint8)
+        trace[0, 1:] = wavefront.GAP_FIRST
+        trace[1:, 0] = wavefront.GAP_SECOND
+        c = f[1:, 1:]
+        s = self.substitutionScores(first, second)
+        trace[1:, 1:] = (c == f[:-1, :-1] + s) * wavefront.MATCH \
+            | (c == f[1:, :-1] + rowGaps[1:, None]) * wavefront.GAP_FIRST \
+            | (c == f[:-1, 1:] + colGaps[None, 1:]) * wavefront.GAP_SECOND
+        return trace
+
+    def tracebackMoves(self, bits):
+        # Moves followed from a cell. If the preferred move is possible, no
+        # alternatives are searched.
+        moves = [move for move in self.moveOrder if bits & move]
+        if moves and moves[0] == self.moveOrder[0]:
+            return moves[:1]
+        return moves
+
+    def followedMoves(self, trace):
+        # Vectorized tracebackMoves over a whole traceback matrix.
+        preferred = self.moveOrder[0]
+        return numpy.where(trace & preferred, preferred, trace) \
+            .astype(numpy.uint8)
+
+    def count_optimal(self, first, second, on_path=False):
+        # Number of alignments backtrace() would produce, computed without
+        # enumerating them. With on_path, also returns the mask of the cells
+        # that lie on some of these alignments.
+        f, trace = self.computeTracebackMatrix(first, second)
+        trace = self.followedMoves(numpy.asarray(trace))
+        terminal = self.terminalMatrix(f)
+        starts = self.startCells(f)
+        counts = wavefront.countPaths(trace, terminal)
+        count = sum(counts[cell] for cell in starts)
+        if on_path:
+            return count, wavefront.markPaths(trace, terminal, starts)
+        return count
+
+    def iter_alignments(self, first, second, max_alignments=None):
+        f, trace = self.computeTracebackMatrix(first, second)
+        return self.iterBacktrace(first, second, f, trace, max_alignments)
+
+    def iterBacktrace(self, first, second, f, trace, max_alignments=None):
+        # Depth-first enumeration of the optimal alignments with an explicit
+        # stack. Each frame holds a cell, the moves left to try from it and
+        # whether entering it pushed an alignment column.
+        if max_alignments is not None and max_alignments <= 0:
+            return
+        m, n = f.shape
+        count = 0
+        # Columns pushed so far, from the start cell backwards.
+        columns = list()
+        for start in self.startCells(f):
+            if self.isTerminal(f, *start):
+                yield self.makeAlignment(first, second, [])
+                count += 1
+                if count == max_alignments:
+                    return
+                continue
+            frames = [(start, iter(self.tracebackMoves(trace[start])),
+                       False)]
+            while frames:
+                (i, j), moves, pushed = frames[-1]
+                move = next(moves, None)
+                if move is None:
+                    frames.pop()
+                    if pushed:
+                        columns.pop()
+                    continue
+                if move == wavefront.MATCH:
+                    cell = (i - 1, j - 1)
+                elif move == wavefront.GAP_FIRST:
+                    cell = (i, j - 1)
+                else:
+                    cell = (i - 1, j)
+                push = not self.isEndGap(move, i, j, m, n)
+                if push:
+                    columns.append((move, i, j, f[i, j] - f[cell]))
+                if self.isTerminal(f, *cell):
+                    yield self.makeAlignment(first, second, columns[::-1])
+                    count += 1
+                    if count == max_alignments:
+                        return
+                    if push:
+                        columns.pop()
+                else:
+                    frames.append((cell, iter(self.tracebackMoves(
+                        trace[cell])), push))
+
+    def backtrace(self, first, second, f):
+        trace = self.tracebackMatrix(first, second, f)
+        return list(self.iterBacktrace(first, second, f, trace))
+
+    def startCells(self, f):
+        m, n = f.shape
+        return [(m - 1, n - 1)]
 
     @abstractmethod
-    def bestScore(self, f):
-        return 0
+    def isTerminal(self, f, i, j):
+        return True
+
+    def terminalMatrix(self, f):
+        # Vectorized isTerminal over a whole alignment matrix.
+        m, n = f.shape
+        terminal = numpy.zeros((m, n), bool)
+        for i, j in numpy.ndindex(m, n):
+            terminal[i, j] = self.isTerminal(f, i, j)
+        return terminal
 
     @abstractmethod
-    def backtrace(self, first, second, f):
-        return list()
+    def bestScore(self, f):
+        return 0
 
 
 class GlobalSequenceAligner(SequenceAligner):
@@ -201,220 +895,304 @@ class GlobalSequenceAligner(SequenceAligner):
     def __init__(self, scoring, gapScore):
         super(GlobalSequenceAligner, self).__init__(scoring, gapScore)
 
-    def computeAlignmentMatrix(self, first, second):
-        m = len(first) + 1
-        n = len(second) + 1
-        f = numpy.zeros((m, n))
-        for i in range(1, m):
-            for j in range(1, n):
-                # Match elements.
-                ab = f[i - 1, j - 1] \
-                    + self.scoring(first[i - 1], second[j - 1])
-
-                # Gap on first sequence.
-                if i == m - 1:
-                    ga = f[i, j - 1]
-                else:
-                    ga = f[i, j - 1] + self.gapScore
+    def gapScores(self, m, n):
+        # Leading and trailing gaps are free.
+        rowGaps, colGaps = super(GlobalSequenceAligner, self).gapScores(m, n)
+        rowGaps[[0, -1]] = 0
+        colGaps[[0, -1]] = 0
+        return rowGaps, colGaps
 
-                # Gap on second sequence.
-                if j == n - 1:
-                    gb = f[i - 1, j]
-                else:
-                    gb = f[i - 1, j] + self.gapScore
-
-                f[i, j] = max(ab, max(ga, gb))
-        return f
+    def isEndGap(self, move, i, j, m, n):
+        if move == wavefront.GAP_FIRST:
+            return i == 0 or i == m - 1
+        if move == wavefront.GAP_SECOND:
+            return j == 0 or j == n - 1
+        return False
 
     def bestScore(self, f):
         return f[-1, -1]
 
-    def backtrace(self, first, second, f):
-        m, n = f.shape
-        alignments = list()
-        alignment = self.emptyAlignment(first, second)
-        self.backtraceFrom(first, second, f, m - 1, n - 1,
-                           alignments, alignment)
-        return alignments
+    def isTerminal(self, f, i, j):
+        return i == 0 or j == 0
 
-    def backtraceFrom(self, first, second, f, i, j, alignments, alignment):
-        if i == 0 or j == 0:
-            alignments.append(alignment.reversed())
-        else:
-            m, n = f.shape
-            c = f[i, j]
-            p = f[i - 1, j - 1]
-            x = f[i - 1, j]
-            y = f[i, j - 1]
-            a = first[i - 1]
-            b = second[j - 1]
-            if c == p + self.scoring(a, b):
-                alignment.push(a, b, c - p)
-                self.backtraceFrom(first, second, f, i - 1, j - 1,
-                                   alignments, alignment)
-                alignment.pop()
-            else:
-                if i == m - 1:
-                    if c == y:
-                        self.backtraceFrom(first, second, f, i, j - 1,
-                                           alignments, alignment)
-                elif c == y + self.gapScore:
-                    alignment.push(alignment.gap, b, c - y)
-                    self.backtraceFrom(first, second, f, i, j - 1,
-                                       alignments, alignment)
-                    alignment.pop()
-                if j == n - 1:
-                    if c == x:
-                        self.backtraceFrom(first, second, f, i - 1, j,
-                                           alignments, alignment)
-                elif c == x + self.gapScore:
-                    alignment.push(a, alignment.gap, c - x)
-                    self.backtraceFrom(first, second, f, i - 1, j,
-                                       alignments, alignment)
-                    alignment.pop()
+    def terminalMatrix(self, f):
+        terminal = numpy.zeros(f.shape, bool)
+        terminal[0, :] = True
+        terminal[:, 0] = True
+        return terminal
 
 
 class StrictGlobalSequenceAligner(SequenceAligner):
+    moveOrder = (wavefront.GAP_SECOND, wavefront.GAP_FIRST, wavefront.MATCH)
 
     def __init__(self, scoring, gapScore):
         super(StrictGlobalSequenceAligner, self).__init__(scoring, gapScore)
 
-    def computeAlignmentMatrix(self, first, second):
-        m = len(first) + 1
-        n = len(second) + 1
-        f = numpy.zeros((m, n))
-        for i in range(1, m):
-            f[i, 0] = f[i - 1, 0] + self.gapScore
-        for j in range(1, n):
-            f[0, j] = f[0, j - 1] + self.gapScore
-        for i in range(1, m):
-            for j in range(1, n):
-                # Match elements.
-                ab = f[i - 1, j - 1] \
-                    + self.scoring(first[i - 1], second[j - 1])
-
-                # Gap on first sequence.
-                ga = f[i, j - 1] + self.gapScore
-
-                # Gap on second sequence.
-                gb = f[i - 1, j] + self.gapScore
-
-                f[i, j] = max(ab, max(ga, gb))
-        return f
-
     def bestScore(self, f):
         return f[-1, -1]
 
-    def backtrace(self, first, second, f):
-        m, n = f.shape
-        alignments = list()
-        alignment = self.emptyAlignment(first, second)
-        self.backtraceFrom(first, second, f, m - 1, n - 1,
-                           alignments, alignment)
-        return alignments
+    def isTerminal(self, f, i, j):
+        return i == 0 and j == 0
+
+    def terminalMatrix(self, f):
+        terminal = numpy.zeros(f.shape, bool)
+        terminal[0, 0] = True
+        return terminal
+
+    def gapScoreBound(self, m, n, matches):
+        return float(self.gapScore) * (m + n - 2 * matches)
+
+
+class BandedStrictGlobalSequenceAligner(StrictGlobalSequenceAligner):
+    # Narrowest band width to start from when the score along the diagonal
+    # does not bound the paths leaving a narrow enough band.
+    initialBandWidth = 8
+    # Cells that the work of a sweep per anti-diagonal is worth, for a
+    # single matrix and for a batch plus each of its matrices, to weigh
+    # banded sweeps against whole ones.
+    diagonalCost = 256
+    batchDiagonalCost = 2048
+    candidateDiagonalCost = 32
+
+    def __init__(self, scoring, gapScore, bandWidth=None):
+        super(BandedStrictGlobalSequenceAligner, self).__init__(
+            scoring, gapScore)
+        self.bandWidth = bandWidth
+
+    def computeBestScore(self, first, second):
+        # Matrices that fit in a block take less work to fill whole than to
+        # find their band.
+        if (len(first) + 1) * (len(second) + 1) <= wavefront.BLOCK_SIZE:
+            return self.bestScore(super(
+                BandedStrictGlobalSequenceAligner,
+                self).computeAlignmentMatrix(first, second))
+        return self.findBands(first, [second])[0][0]
+
+    def align_many(self, target, candidates):
+        return self.findBands(target, candidates)[0]
+
+    def computeAlignmentMatrix(self, first, second):
+        return numpy.asarray(self.computeTracebackMatrix(first, second)[0])
 
-    def backtraceFrom(self, first, second, f, i, j, alignments, alignment):
-        if i == 0 and j == 0:
-            alignments.append(alignment.reversed())
+    def computeTracebackMatrix(self, first, second):
+        # Alignment and traceback matrices that only store the band.
+        band = self.findBands(first, [second])[1][0]
+        return self.bandMatrix(first, second, band, traceback=True)
+
+    def bandMatrix(self, first, second, band, traceback=False):
+        # Alignment matrix within the band, and optionally its traceback
+        # matrix, both as wavefront.BandMatrix.
+        m = len(first) + 1
+        n = len(second) + 1
+        band = (int(band[0]), int(band[1]))
+        f = wavefront.BandMatrix(m, n, band, -numpy.inf)
+        trace = None
+        if traceback:
+            trace = wavefront.BandMatrix(m, n, band, 0, numpy.uint8)
+        rowGaps, colGaps = self.gapScores(m, n)
+        wavefront.bandBoundary(f, rowGaps, colGaps, trace)
+        wavefront.bandFill(f, self.substitutionPairs(first, second),
+                           rowGaps, colGaps, trace)
+        return f, trace
+
+    def bandScores(self, target, candidates, band=None):
+        # Last cells of the matrices of target against each of the
+        # candidates, within the band (lo, hi) if given. Few matrices are
+        # swept on their own, which takes less work per diagonal than a
+        # batch.
+        if self.diagonalWork(len(candidates)) == self.diagonalCost:
+            return numpy.array([self.sweepScore(target, c, band)
+                                for c in candidates])
+        return self.sweepMany(target, candidates, band)[0]
+
+    def diagonalWork(self, count):
+        # Cells that the work per anti-diagonal and matrix of sweeping count
+        # matrices is worth.
+        return min(self.diagonalCost, self.candidateDiagonalCost
+                   + self.batchDiagonalCost / float(count))
+
+    def diagonalScores(self, target, candidates):
+        # Scores of the paths of target against each of the candidates that
+        # substitute along the diagonal and take the remaining gaps at the
+        # end, which bound their best scores from below.
+        m = len(target)
+        lengths = numpy.array([len(c) for c in candidates], int)
+        shortest = numpy.minimum(m, lengths)
+        target = elementArray(target)
+        pairs = self.scoring.score_pairs(
+            numpy.concatenate([target[:k] for k in shortest]),
+            numpy.concatenate([elementArray(c)[:k]
+                               for c, k in zip(candidates, shortest)]))
+        scores = numpy.bincount(numpy.repeat(numpy.arange(len(lengths)),
+                                             shortest), pairs, len(lengths))
+        return scores + self.gapScore * numpy.abs(lengths - m)
+
+    def findBands(self, target, candidates):
+        # Scores of target against each of the candidates and the bands
+        # they were computed in. Every candidate is swept within the
+        # narrowest band whose leaving paths score below a lower bound of
+        # its score: first the score along the diagonal, then the banded
+        # score of the round before, from which the band at most doubles.
+        # Candidates for which the rounds would take about as much work as
+        # sweeping their whole matrix are swept whole.
+        candidates = list(candidates)
+        count = len(candidates)
+        scores = numpy.zeros(count)
+        bands = numpy.zeros((count, 2), int)
+        if not count:
+            return scores, bands
+        m = len(target) + 1
+        lengths = numpy.array([len(c) + 1 for c in candidates], int)
+        shortest = numpy.minimum(m, lengths) - 1
+        # Work of the anti-diagonals of another sweep.
+        diagonals = m + lengths.max() - 1
+        sweepCost = diagonals * min(self.diagonalCost * count,
+                                    self.batchDiagonalCost)
+
+        def tolerance(score):
+            # Allow for rounding errors of the scores.
+            return 1e-9 * (1 + numpy.abs(score))
+
+        def bound(width, k):
+            # A path leaving the band takes at least |n - m| + 2 * (width +
+            # 1) gaps, which leaves at most shortest - width - 1
+            # substitutions.
+            matches = shortest[k] - width - 1
+            return numpy.where(matches >= 0, leaving[
+                k, numpy.maximum(matches, 0)], -numpy.inf)
+
+        def needed(lower, k):
+            # Narrowest widths whose leaving paths score below lower.
+            below = (leaving[k] < (lower - tolerance(lower))[:, None]).sum(1)
+            return numpy.maximum(0, shortest[k] + 1 - below)
+
+        def cost(width, k, shared):
+            # Work of a sweep in the band of the width, along with as many
+            # matrices.
+            cells = numpy.minimum(lengths[k],
+                                  numpy.abs(lengths[k] - m) + 2 * width + 1)
+            return m * cells + diagonals * self.diagonalWork(shared)
+
+        def rounds(width, needed, k, shared):
+            # Work of the rounds from width, doubling up to needed.
+            total = cost(width, k, shared)
+            while (width < needed).any():
+                width = numpy.minimum(needed, 2 * numpy.maximum(width, 1))
+                total = total + cost(width, k, shared)
+            return total
+
+        everyone = numpy.arange(count)
+        full = numpy.maximum(m, lengths)
+        whole = cost(full, everyone, count)
+        # Bounds of the paths with at most so many substitutions, up to the
+        # length of the shorter sequence, and bounds of the scores from below,
+        # unless no band takes little enough work to pay for finding it.
+        banded = self.bandWidth is not None or \
+            (1.5 * cost(0, everyone, count) <= whole).any()
+        if banded:
+            leaving = self.matchBounds(target, candidates)
+            leaving = numpy.where(
+                numpy.arange(leaving.shape[1]) <= shortest[:, None],
+                numpy.maximum.accumulate(leaving, axis=1), numpy.inf)
+            lower = self.diagonalScores(target, candidates)
+        if self.bandWidth is not None:
+            width = numpy.full(count, self.bandWidth)
+        elif banded:
+            width = needed(lower, everyone)
+            # Where the diagonal bounds no narrow band, as after indels, a
+            # band whose cells take about half the work of its diagonals
+            # finds a better lower bound. As that may take another round, it
+            # is only swept in at most two thirds of the work of a whole
+            # sweep, while the band of the diagonal takes a single round and
+            # is kept in up to four fifths of it, and up to a quarter more
+            # work than the other.
+            overhead = whole - m * lengths
+            cells = numpy.minimum(overhead / 2, whole / 1.5 - overhead) / m
+            probe = numpy.maximum(self.initialBandWidth, (
+                cells - numpy.abs(lengths - m) - 1) // 2).astype(int)
+            diagonal = cost(width, everyone, count)
+            probing = cost(probe, everyone, count)
+            width = numpy.where(
+                (diagonal <= 1.25 * probing) & (1.25 * diagonal <= whole),
+                width, numpy.where(1.5 * probing <= whole, probe, m))
         else:
-            c = f[i, j]
-            if i != 0:
-                x = f[i - 1, j]
-                a = first[i - 1]
-                if c == x + self.gapScore:
-                    alignment.push(a, alignment.gap, c - x)
-                    self.backtraceFrom(first, second, f, i - 1, j,
-                                       alignments, alignment)
-                    alignment.pop()
-                    return
-            if j != 0:
-                y = f[i, j - 1]
-                b = second[j - 1]
-                if c == y + self.gapScore:
-                    alignment.push(alignment.gap, b, c - y)
-                    self.backtraceFrom(first, second, f, i, j - 1,
-                                       alignments, alignment)
-                    alignment.pop()
-            if i != 0 and j != 0:
-                p = f[i - 1, j - 1]
-                # Silence the code inspection warning. We know at this point
-                # that a and b are assigned to values.
-                # noinspection PyUnboundLocalVariable
-                if c == p + self.scoring(a, b):
-                    alignment.push(a, b, c - p)
-                    self.backtraceFrom(first, second, f, i - 1, j - 1,
-                                       alignments, alignment)
-                    alignment.pop()
+            width = full
+        # Candidates swept whole take a band that holds their matrix, and
+        # take a sweep without bands if all of them do.
+        width = numpy.where(cost(width, everyone, count) >= whole, full,
+                            width)
+        if (width >= full).all():
+            bands[:] = numpy.transpose(wavefront.band(m, lengths, full))
+            return self.bandScores(target, candidates), bands
+        spent = numpy.zeros(count)
+        pending = everyone
+        while len(pending):
+            # The narrowest bands are widened to share a sweep while that
+            # takes less work than another sweep.
+            pending = pending[numpy.argsort(width[pending], kind='stable')]
+            widths = numpy.minimum(width[pending], full[pending])
+            shared = 2 * m * (numpy.arange(1, len(pending) + 1) * widths
+                              - numpy.cumsum(widths)) <= sweepCost
+            group, pending = pending[shared], pending[~shared]
+            common = int(widths[shared].max())
+            band = wavefront.band(m, lengths[group], common)
+            band = (int(band[0].min()), int(band[1].max()))
+            score = self.bandScores(
+                target, [candidates[k] for k in group],
+                band if band[0] > 1 - m or band[1] < lengths[group].max() - 1
+                else None)
+            done = bound(common, group) < score - tolerance(score)
+            scores[group[done]] = score[done]
+            bands[group[done]] = band
+            spent[group] += cost(common, group, len(group))
+            group = group[~done]
+            lower[group] = numpy.maximum(lower[group], score[~done])
+            need = needed(lower[group], group)
+            width[group] = numpy.minimum(need, 2 * max(common, 1))
+            # The candidates left share the sweeps to come, and are swept
+            # whole once the rounds would take as much work.
+            left = max(1, len(pending) + len(group))
+            costly = spent[group] + rounds(width[group], need, group, left) \
+                >= cost(full[group], group, left)
+            width[group[costly]] = full[group[costly]]
+            pending = numpy.concatenate([pending, group])
+        return scores, bands
 
 
 class LocalSequenceAligner(SequenceAligner):
+    floorScore = 0
+    linearSpace = False
 
     def __init__(self, scoring, gapScore, minScore=None):
         super(LocalSequenceAligner, self).__init__(scoring, gapScore)
         self.minScore = minScore
 
-    def computeAlignmentMatrix(self, first, second):
-        m = len(first) + 1
-        n = len(second) + 1
-        f = numpy.zeros((m, n))
-        for i in range(1, m):
-            for j in range(1, n):
-                # Match elements.
-                ab = f[i - 1, j - 1] \
-                    + self.scoring(first[i - 1], second[j - 1])
-
-                # Gap on sequenceA.
-                ga = f[i, j - 1] + self.gapScore
+    def sweepScore(self, first, second):
+        return self.sweep(first, second)[1]
 
-                # Gap on sequenceB.
-                gb = f[i - 1, j] + self.gapScore
+    def align_many(self, target, candidates):
+        return self.sweepMany(target, candidates)[1]
 
-                f[i, j] = max(0, max(ab, max(ga, gb)))
-        return f
+    def gapScores(self, m, n):
+        # The first row and column stay at the floor score, also with
+        # positive gap scores.
+        rowGaps, colGaps = super(LocalSequenceAligner, self).gapScores(m, n)
+        rowGaps[0] = 0
+        colGaps[0] = 0
+        return rowGaps, colGaps
 
     def bestScore(self, f):
         return f.max()
 
-    def backtrace(self, first, second, f):
-        m, n = f.shape
-        alignments = list()
-        alignment = self.emptyAlignment(first, second)
+    def startCells(self, f):
         if self.minScore is None:
             minScore = self.bestScore(f)
         else:
             minScore = self.minScore
-        for i in range(m):
-            for j in range(n):
-                if f[i, j] >= minScore:
-                    self.backtraceFrom(first, second, f, i, j,
-                                       alignments, alignment)
-        return alignments
-
-    def backtraceFrom(self, first, second, f, i, j, alignments, alignment):
-        if f[i, j] == 0:
-            alignments.append(alignment.reversed())
-        else:
-            c = f[i, j]
-            p = f[i - 1, j - 1]
-            x = f[i - 1, j]
-            y = f[i, j - 1]
-            a = first[i - 1]
-            b = second[j - 1]
-            if c == p + self.scoring(a, b):
-                alignment.push(a, b, c - p)
-                self.backtraceFrom(first, second, f, i - 1, j - 1,
-                                   alignments, alignment)
-                alignment.pop()
-            else:
-                if c == y + self.gapScore:
-                    alignment.push(alignment.gap, b, c - y)
-                    self.backtraceFrom(first, second, f, i, j - 1,
-                                       alignments, alignment)
-                    alignment.pop()
-                if c == x + self.gapScore:
-                    alignment.push(a, alignment.gap, c - x)
-                    self.backtraceFrom(first, second, f, i - 1, j,
-                                       alignments, alignment)
-                    alignment.pop()
+        return [tuple(cell) for cell in numpy.argwhere(f >= minScore)]
 
+    def isTerminal(self, f, i, j):
+        return f[i, j] == 0
 
+    def terminalMatrix(self, f):
+        return f == 0
@@ -1,11 +1,19 @@
+import random
+import timeit
 from abc import ABCMeta
 
+import numpy
+
 from .vocabulary import Vocabulary
 from .sequence import Sequence
+from .sequence import EncodedSequence
 from .sequencealigner import SimpleScoring
+from .sequencealigner import MatrixScoring
 from .sequencealigner import GlobalSequenceAligner
 from .sequencealigner import StrictGlobalSequenceAligner
+from .sequencealigner import BandedStrictGlobalSequenceAligner
 from .sequencealigner import LocalSequenceAligner
+from . import wavefront
 
 
 DEFAULT_MATCH_SCORE = 3
@@ -17,10 +25,10 @@ DEFAULT_SCORING = SimpleScoring(DEFAULT_MATCH_SCORE, DEFAULT_MISMATCH_SCORE)
 
 def _align(first, second, aligner, **kwargs):
     vocab = Vocabulary()
+    kwargs.setdefault('backtrace', True)
     score, encodeds = aligner.align(
         vocab.encodeSequence(Sequence(first)),
         vocab.encodeSequence(Sequence(second)),
-        backtrace=True,
         **kwargs
     )
     return score, [vocab.decodeSequenceAlignment(encoded) for encoded in encodeds]
@@ -183,6 +191,11 @@ class TestStrictGlobalSequenceAligner(SequenceAlignerTests):
         assert alignments[0].score == score
 
 
+class TestBandedStrictGlobalSequenceAligner(TestStrictGlobalSequenceAligner):
+    ALIGNER = BandedStrictGlobalSequenceAligner(DEFAULT_SCORING,
+                                                DEFAULT_GAP_SCORE, 0)
+
+
 class TestLocalSequenceAligner(SequenceAlignerTests):
     ALIGNER = LocalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
 
@@ -222,3 +235,383 @@ class TestLocalSequenceAligner(SequenceAlignerTests):
         assert alignments[0].percentGap() == 0.0
         assert score == DEFAULT_MATCH_SCORE * 2
         assert alignments[0].score == score
+
+
+def _scalarMatrix(first, second, scoring, gapScore, strict=False,
+                  local=False):
+    # Reference cell-by-cell recurrence.
+    m = len(first) + 1
+    n = len(second) + 1
+    f = numpy.zeros((m, n))
+    if strict:
+        for i in range(1, m):
+            f[i, 0] = f[i - 1, 0] + gapScore
+        for j in range(1, n):
+            f[0, j] = f[0, j - 1] + gapScore
+    free = not strict and not local
+    for i in range(1, m):
+        for j in range(1, n):
+            ab = f[i - 1, j - 1] + scoring(first[i - 1], second[j - 1])
+            ga = f[i, j - 1] + (0 if free and i == m - 1 else gapScore)
+            gb = f[i - 1, j] + (0 if free and j == n - 1 else gapScore)
+            f[i, j] = max(ab, max(ga, gb))
+            if local:
+                f[i, j] = max(0, f[i, j])
+    return f
+
+
+def test_alignment_matrix_matches_scalar_recurrence():
+    rnd = random.Random(0)
+    for _ in range(50):
+        matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                      for a in range(1, 5) for b in range(a, 5))
+        scoring = MatrixScoring(matrix)
+        # Small matrices are filled cell by cell, larger ones by diagonals.
+        first = EncodedSequence([rnd.randint(1, 4)
+                                 for _ in range(rnd.randint(0, 30))])
+        second = EncodedSequence([rnd.randint(1, 4)
+                                  for _ in range(rnd.randint(0, 30))])
+        gapScore = rnd.choice([-1, -0.1, -2.5, 0.5])
+        for aligner, kwargs in [
+                (GlobalSequenceAligner, {}),
+                (StrictGlobalSequenceAligner, {'strict': True}),
+                (LocalSequenceAligner, {'local': True})]:
+            f = aligner(scoring, gapScore).computeAlignmentMatrix(
+                first, second)
+            expected = _scalarMatrix(first, second, scoring, gapScore,
+                                     **kwargs)
+            assert f.tobytes() == expected.tobytes()
+
+
+def test_score_only_matches_full_matrix():
+    rnd = random.Random(1)
+    for _ in range(50):
+        matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                      for a in range(1, 5) for b in range(a, 5))
+        scoring = MatrixScoring(matrix)
+        first = EncodedSequence([rnd.randint(1, 4)
+                                 for _ in range(rnd.randint(0, 12))])
+        second = EncodedSequence([rnd.randint(1, 4)
+                                  for _ in range(rnd.randint(0, 12))])
+        gapScore = rnd.choice([-1, -0.1, -2.5, 0.5])
+        for aligner in [GlobalSequenceAligner(scoring, gapScore),
+                        StrictGlobalSequenceAligner(scoring, gapScore),
+                        LocalSequenceAligner(scoring, gapScore)]:
+            f = aligner.computeAlignmentMatrix(first, second)
+            assert aligner.align(first, second) == aligner.bestScore(f)
+            assert aligner.sweepScore(first, second) == aligner.bestScore(f)
+            assert aligner.align_many(first, [second])[0] == \
+                aligner.bestScore(f)
+
+
+def test_linear_space_backtrace():
+    blockSize = wavefront.BLOCK_SIZE
+    wavefront.BLOCK_SIZE = 4
+    try:
+        rnd = random.Random(2)
+        for _ in range(50):
+            first = EncodedSequence([rnd.randint(1, 3)
+                                     for _ in range(rnd.randint(0, 15))])
+            second = EncodedSequence([rnd.randint(1, 3)
+                                      for _ in range(rnd.randint(0, 15))])
+            for aligner in [GlobalSequenceAligner(DEFAULT_SCORING,
+                                                  DEFAULT_GAP_SCORE),
+                            StrictGlobalSequenceAligner(DEFAULT_SCORING,
+                                                        DEFAULT_GAP_SCORE)]:
+                score, alignments = aligner.align(first, second,
+                                                  backtrace=True)
+                linearScore, linearAlignments = aligner.align(
+                    first, second, backtrace='one', linear_space=True)
+                assert len(linearAlignments) == 1
+                assert linearScore == score
+                assert linearAlignments[0].score == score
+    finally:
+        wavefront.BLOCK_SIZE = blockSize
+
+    score, alignments = _align(
+        'xaby', 'aob', StrictGlobalSequenceAligner(DEFAULT_SCORING,
+                                                   DEFAULT_GAP_SCORE),
+        backtrace='one', linear_space=True)
+    assert len(alignments) == 1
+    assert str(alignments[0].first) == 'x a - b y'
+    assert str(alignments[0].second) == '- a o b -'
+    assert alignments[0].percentIdentity() == 2.0 / 5.0 * 100.0
+    assert alignments[0].percentGap() == 3.0 / 5.0 * 100.0
+
+
+def test_linear_space_backtrace_local():
+    aligner = LocalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    try:
+        _align('xaby', 'aob', aligner, backtrace='one', linear_space=True)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_iter_alignments_is_lazy():
+    vocab = Vocabulary()
+    first = vocab.encodeSequence(Sequence('ab' * 20))
+    second = vocab.encodeSequence(Sequence('ab' * 10))
+    aligner = LocalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    alignments = list(aligner.iter_alignments(first, second,
+                                              max_alignments=3))
+    assert len(alignments) == 3
+    assert all(a.score == DEFAULT_MATCH_SCORE * 20 for a in alignments)
+
+
+def test_backtrace_long_sequences():
+    first = EncodedSequence([1, 2, 3] * 400)
+    second = EncodedSequence([1, 2, 3] * 399)
+    aligner = StrictGlobalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    score, alignments = aligner.align(first, second, backtrace='one')
+    assert len(alignments) == 1
+    assert alignments[0].score == score
+    assert len(alignments[0]) == 1200
+
+
+def test_count_optimal():
+    vocab = Vocabulary()
+    for first, second in [('abxc', 'axbc'), ('xabcabcy', 'abc'),
+                          ('aac', 'bac')]:
+        fe = vocab.encodeSequence(Sequence(first))
+        se = vocab.encodeSequence(Sequence(second))
+        for aligner in [
+                GlobalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE),
+                StrictGlobalSequenceAligner(DEFAULT_SCORING, -1),
+                LocalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)]:
+            score, alignments = aligner.align(fe, se, backtrace=True)
+            assert aligner.count_optimal(fe, se) == len(alignments)
+
+    fe = vocab.encodeSequence(Sequence('abc'))
+    aligner = StrictGlobalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    count, mask = aligner.count_optimal(fe, fe, on_path=True)
+    assert count == 1
+    assert (mask == numpy.identity(4, bool)).all()
+
+
+def test_count_optimal_repetitive():
+    aligner = GlobalSequenceAligner(SimpleScoring(1, -1), -1)
+    first = EncodedSequence([1, 2, 1] * 8)
+    second = EncodedSequence([1, 2] * 8)
+    score, alignments = aligner.align(first, second, backtrace=True)
+    assert aligner.count_optimal(first, second) == len(alignments) == 34
+
+    # The counts follow the Fibonacci numbers, F(101) > 2 ** 64.
+    first = EncodedSequence([1, 2, 1] * 100)
+    second = EncodedSequence([1, 2] * 100)
+    assert aligner.count_optimal(first, second) == 573147844013817084101
+
+
+def test_banded_matches_strict():
+    rnd = random.Random(3)
+    for _ in range(50):
+        matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                      for a in range(1, 5) for b in range(a, 5))
+        scoring = MatrixScoring(matrix)
+        length = rnd.randint(0, 30)
+        first = EncodedSequence([rnd.randint(1, 4) for _ in range(length)])
+        second = EncodedSequence([rnd.randint(1, 4) for _ in
+                                  range(max(0, length + rnd.randint(-3, 3)))])
+        strict = StrictGlobalSequenceAligner(scoring, -1)
+        for bandWidth in [None, 0, 2]:
+            banded = BandedStrictGlobalSequenceAligner(scoring, -1, bandWidth)
+            assert banded.align(first, second) == strict.align(first, second)
+            assert banded.align_many(first, [second])[0] == \
+                strict.align(first, second)
+            score, alignments = banded.align(first, second, backtrace='one')
+            assert score == strict.align(first, second)
+            assert abs(alignments[0].score - score) < 1e-9
+
+
+def test_banded_computes_band_only():
+    first = EncodedSequence([1, 2, 3, 4] * 25)
+    second = EncodedSequence([1, 2, 3, 4] * 25)
+    aligner = BandedStrictGlobalSequenceAligner(DEFAULT_SCORING,
+                                                DEFAULT_GAP_SCORE, 2)
+    f, trace = aligner.computeTracebackMatrix(first, second)
+    assert f[-1, -1] == DEFAULT_MATCH_SCORE * 100
+    assert f.data.size < 0.1 * 101 * 101
+    assert trace.data.size < 0.1 * 101 * 101
+    f = aligner.computeAlignmentMatrix(first, second)
+    assert f[-1, -1] == DEFAULT_MATCH_SCORE * 100
+    assert numpy.isinf(f).sum() > 0.9 * f.size
+
+
+def test_banded_align_many():
+    rnd = random.Random(7)
+    matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                  for a in range(1, 5) for b in range(a, 5))
+    target = [rnd.randint(1, 4) for _ in range(40)]
+    candidates = [[], [1]]
+    for _ in range(12):
+        # Copies of the target with substitutions and a few indels.
+        candidate = list(target)
+        for _ in range(rnd.randint(0, 8)):
+            k = rnd.randrange(len(candidate))
+            action = rnd.choice('sid')
+            if action == 's':
+                candidate[k] = rnd.randint(1, 4)
+            elif action == 'i':
+                candidate.insert(k, rnd.randint(1, 4))
+            else:
+                del candidate[k]
+        candidates.append(candidate)
+    candidates += [[rnd.randint(1, 4) for _ in range(rnd.randint(30, 50))]
+                   for _ in range(4)]
+    target = EncodedSequence(target)
+    candidates = [EncodedSequence(c) for c in candidates]
+    for gapScore in [-1, -0.3]:
+        strict = StrictGlobalSequenceAligner(MatrixScoring(matrix), gapScore)
+        expected = list(strict.align_many(target, candidates))
+        for bandWidth in [None, 0, 3]:
+            banded = BandedStrictGlobalSequenceAligner(
+                MatrixScoring(matrix), gapScore, bandWidth)
+            assert list(banded.align_many(target, candidates)) == expected
+            assert [banded.align_many(target, [c])[0]
+                    for c in candidates[:6]] == expected[:6]
+
+
+def near_diagonal(target, rnd, substitutions, indels=0):
+    # Copy of the target with some substitutions and indels.
+    candidate = list(target)
+    for _ in range(substitutions):
+        candidate[rnd.randrange(len(candidate))] = rnd.randint(1, 20)
+    for _ in range(indels):
+        k = rnd.randrange(len(candidate))
+        if rnd.random() < 0.5:
+            candidate.insert(k, rnd.randint(1, 20))
+        else:
+            del candidate[k]
+    return EncodedSequence(candidate)
+
+
+def test_banded_near_diagonal():
+    rnd = random.Random(11)
+    matrix = dict(((a, b), rnd.choice([4, 5, 6]) if a == b else
+                   rnd.randint(-3, 1))
+                  for a in range(1, 21) for b in range(a, 21))
+    target = [rnd.randint(1, 20) for _ in range(1000)]
+    candidates = [near_diagonal(target, rnd, 100, indels)
+                  for indels in [0, 0, 3, 10]]
+    target = EncodedSequence(target)
+    for scoring in [SimpleScoring(2, -1), MatrixScoring(matrix)]:
+        strict = StrictGlobalSequenceAligner(scoring, -2)
+        expected = list(strict.align_many(target, candidates))
+        for bandWidth in [None, 0]:
+            banded = BandedStrictGlobalSequenceAligner(scoring, -2,
+                                                       bandWidth)
+            assert list(banded.align_many(target, candidates)) == expected
+            assert [banded.align(target, c) for c in candidates] == expected
+        score, alignments = banded.align(target, candidates[2],
+                                         backtrace='one')
+        assert abs(alignments[0].score - expected[2]) < 1e-9
+
+
+def test_banded_not_slower_near_diagonal():
+    # Copies of a sequence with substitutions take no longer in their bands
+    # than whole, both on their own and in batches.
+    rnd = random.Random(12)
+    target = [rnd.randint(1, 20) for _ in range(1000)]
+    single = near_diagonal(target, rnd, 100)
+    target = EncodedSequence(target)
+    short = EncodedSequence(target[:250])
+    batch = [near_diagonal(short, rnd, 25) for _ in range(50)]
+    strict = StrictGlobalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    banded = BandedStrictGlobalSequenceAligner(DEFAULT_SCORING,
+                                               DEFAULT_GAP_SCORE)
+    for calls in [lambda aligner: aligner.align(target, single),
+                  lambda aligner: aligner.align_many(short, batch)]:
+        assert numpy.array_equal(calls(banded), calls(strict))
+        times = [min(timeit.repeat(lambda: calls(aligner), number=1,
+                                   repeat=5))
+                 for aligner in [strict, banded]]
+        assert times[1] <= times[0]
+
+
+def test_sweep_many_band():
+    rnd = numpy.random.RandomState(8)
+    m = 15
+    lengths = numpy.array([1, 5, 12, 15, 20]) + 1
+    scores = rnd.uniform(-2, 3, (len(lengths), m - 1, lengths.max() - 1))
+    rowGaps = numpy.full(m, -1.0)
+    colGaps = numpy.full((len(lengths), lengths.max()), -1.0)
+    for width in [0, 2, 30]:
+        band = wavefront.band(m, lengths, width)
+        swept = wavefront.sweepMany(
+            m, lengths, lambda i, j: scores[:, i - 1, j - 1], rowGaps,
+            colGaps, band=band)[0]
+        for k, n in enumerate(lengths):
+            f = wavefront.BandMatrix(m, n, (band[0][k], band[1][k]),
+                                     -numpy.inf)
+            wavefront.bandBoundary(f, rowGaps, colGaps[k])
+            wavefront.bandFill(f, lambda i, j: scores[k, i - 1, j - 1],
+                               rowGaps, colGaps[k])
+            assert f[-1, -1] == swept[k]
+            assert wavefront.lastCell(
+                m, n, lambda i, j: scores[k, i - 1, j - 1], rowGaps,
+                colGaps[k], band=(band[0][k], band[1][k])) == swept[k]
+    # A band holding the whole matrices changes nothing.
+    assert swept.tolist() == wavefront.sweepMany(
+        m, lengths, lambda i, j: scores[:, i - 1, j - 1], rowGaps,
+        colGaps)[0].tolist()
+
+
+def test_align_many():
+    rnd = random.Random(5)
+    matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                  for a in range(1, 5) for b in range(a, 5))
+    target = EncodedSequence([rnd.randint(1, 4) for _ in range(12)])
+    candidates = [EncodedSequence([rnd.randint(1, 4) for _ in range(length)])
+                  for length in [0, 1, 7, 12, 20]]
+    for aligner in [GlobalSequenceAligner(MatrixScoring(matrix), -1),
+                    StrictGlobalSequenceAligner(DEFAULT_SCORING, -0.5),
+                    LocalSequenceAligner(MatrixScoring(matrix), -1)]:
+        scores = aligner.align_many(target, candidates)
+        assert list(scores) == [aligner.align(target, c) for c in candidates]
+    assert len(aligner.align_many(target, [])) == 0
+
+
+def test_best_matches():
+    rnd = random.Random(6)
+    matrix = dict(((a, b), rnd.uniform(-2.0, 3.0))
+                  for a in range(1, 6) for b in range(a, 6))
+    target = EncodedSequence([rnd.randint(1, 5) for _ in range(10)])
+    candidates = [EncodedSequence([rnd.randint(1, 5)
+                                   for _ in range(rnd.randint(0, 14))])
+                  for _ in range(60)]
+    candidates.append(candidates[7])
+    for aligner in [GlobalSequenceAligner(MatrixScoring(matrix), -1),
+                    StrictGlobalSequenceAligner(DEFAULT_SCORING, -1),
+                    BandedStrictGlobalSequenceAligner(DEFAULT_SCORING, -1),
+                    LocalSequenceAligner(MatrixScoring(matrix), -1)]:
+        scores = [aligner.align(target, c) for c in candidates]
+        assert all(score <= bound for score, bound in
+                   zip(scores, aligner.scoreBounds(target, candidates)))
+        order = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+        for k in [1, 3]:
+            matches = aligner.best_matches(target, candidates, k,
+                                           batchSize=4)
+            assert matches == [(i, scores[i]) for i in order[:k]]
+        assert aligner.best_matches(target, candidates, 0) == []
+        assert aligner.best_matches(target, candidates, -1) == []
+
+
+def test_alignment_path():
+    vocab = Vocabulary()
+    first = vocab.encodeSequence(Sequence('xaboc'))
+    second = vocab.encodeSequence(Sequence('abcy'))
+    aligner = LocalSequenceAligner(DEFAULT_SCORING, DEFAULT_GAP_SCORE)
+    score, alignments = aligner.align(first, second, backtrace=True)
+    path = alignments[0]
+    assert not hasattr(path, '__dict__')
+    assert path.ops.dtype == numpy.uint8
+    assert path.opstring() == 'MMDM'
+    assert path.start == (1, 0)
+    assert str(vocab.decodeSequence(path.first)) == 'a b o c'
+    assert str(vocab.decodeSequence(path.second)) == 'a b - c'
+    assert list(path.scores) == [3, 3, DEFAULT_GAP_SCORE, 3]
+    assert path.score == score == sum(path.scores)
+    assert (path.identicalCount, path.similarCount, path.gapCount) == \
+        (3, 3, 1)
+    assert path.percentGap() == 25.0
@@ -1,30 +1,145 @@
+import os
 import re
 import math
+import tempfile
+
+import numpy
+
+from .sequence import EncodedSequence
+
 
 class clustersequenceloader(object):
     """sequenceloader class"""
 
+    src_col = 12
+    dst_col = 13
+    flag_col = 21
+    cluster_col = 23
+    unbound = "UNB"
+
     def __init__(self):
         pass
 
     def load(self, filepath, length):
         """Load cluster sequence from the file specified."""
-        src_col = 12
-        dst_col = 13
-        flag_col = 21
-        cluster_col = 23
+        positions, clusters = self.parse(filepath)
+        seq = [self.unbound]*length
+        for position, cluster in zip(positions, clusters):
+            seq[position-1] = str(cluster)
+        return seq
 
+    def parse(self, filepath):
+        """Return positions and clusters of the bonded residues in the
+        file specified."""
         regex = re.compile("__[US][US]$")
-        
-        seq = ["UNB"]*length
+        positions = []
+        clusters = []
         with open(filepath) as fh:
             for line in fh:
-                fields = line.strip().split()
-                if not regex.search(fields[flag_col]):
-                    continue
-                seq[int(fields[src_col])-1] = fields[cluster_col]
+                fields = line.split()
+                if regex.search(fields[self.flag_col]):
+                    positions.append(fields[self.src_col])
+                    clusters.append(fields[self.cluster_col])
+        return (numpy.array(positions, dtype=int),
+                numpy.array(clusters, dtype=str))
+
+    def loaddir(self, dirpath, length, vocabulary, cachefile=None):
+        """Load and encode the cluster sequences of all files in the
+        directory specified, keyed by file name without extension.
+        length is either an int or a function of the file path."""
+        filepaths = sorted(os.path.join(dirpath, name)
+                           for name in os.listdir(dirpath))
+        if callable(length):
+            lengths = [length(f) for f in filepaths]
+        else:
+            lengths = [length]*len(filepaths)
+        sequences = self.loadmany(filepaths, lengths, vocabulary, cachefile)
+        return {os.path.splitext(os.path.basename(f))[0]: seq
+                for f, seq in zip(filepaths, sequences)}
+
+    def loadmany(self, filepaths, lengths, vocabulary, cachefile=None):
+        """Load the files specified as EncodedSequences of the given
+        lengths, encoded with vocabulary.
+
+        If cachefile is given, parsed files are kept there in .npz form,
+        keyed by path, modification time and size, so that unchanged files
+        are not parsed again.
+        """
+        cache = self.readcache(cachefile)
+        changed = False
+        parsed = []
+        for filepath in filepaths:
+            stat = os.stat(filepath)
+            key = os.path.abspath(filepath)
+            entry = cache.get(key)
+            if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+                entry = (stat.st_mtime_ns, stat.st_size) \
+                    + self.parse(filepath)
+                cache[key] = entry
+                changed = True
+            parsed.append(entry[2:])
+        if cachefile is not None and changed:
+            self.writecache(cachefile, cache)
+
+        # Encode every distinct cluster once.
+        clusters = numpy.concatenate(
+            [numpy.array([self.unbound])] + [c for _, c in parsed])
+        names, inverse = numpy.unique(clusters, return_inverse=True)
+        codes = numpy.array([vocabulary.encode(str(n)) for n in names])
+        inverse = codes[numpy.ravel(inverse)].astype(vocabulary.dtype())
+        sequences = []
+        start = 1
+        for filepath, length, (positions, clusters) in zip(
+                filepaths, lengths, parsed):
+            elements = numpy.full(length, inverse[0])
+            elements[positions-1] = inverse[start:start+len(clusters)]
+            start += len(clusters)
+            name = os.path.splitext(os.path.basename(filepath))[0]
+            sequences.append(EncodedSequence(elements, id=name))
+        return sequences
+
+    def readcache(self, cachefile):
+        """Return cache entries (mtime, size, positions, clusters) by
+        path."""
+        if cachefile is None or not os.path.exists(cachefile):
+            return {}
+        with numpy.load(cachefile) as data:
+            data = dict(data)
+        bounds = numpy.cumsum(numpy.concatenate(([0], data["counts"])))
+        return {str(path): (int(mtime), int(size),
+                            data["positions"][lo:hi],
+                            data["clusters"][lo:hi])
+                for path, mtime, size, lo, hi in zip(
+                    data["paths"], data["mtimes"], data["sizes"],
+                    bounds[:-1], bounds[1:])}
+
+    def writecache(self, cachefile, cache):
+        paths = sorted(cache)
+        entries = [cache[p] for p in paths]
+        # Write to a temporary file of our own and replace the cache at
+        # once, in case other processes read or write it too.
+        fd, tmpfile = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(cachefile)), suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                numpy.savez(
+                    fh,
+                    paths=numpy.array(paths, dtype=str).reshape(-1),
+                    mtimes=numpy.array([e[0] for e in entries],
+                                       dtype=numpy.int64),
+                    sizes=numpy.array([e[1] for e in entries],
+                                      dtype=numpy.int64),
+                    counts=numpy.array([len(e[2]) for e in entries],
+                                       dtype=int),
+                    positions=numpy.concatenate(
+                        [numpy.zeros(0, int)] + [e[2] for e in entries]),
+                    clusters=numpy.concatenate(
+                        [numpy.zeros(0, str)] + [e[3] for e in entries]))
+            os.replace(tmpfile, cachefile)
+        except BaseException:
+            os.remove(tmpfile)
+            raise
 
-        return seq
 
 class localpatternsequenceloader(object):
     '''Sequence loader for local pattern'''
@@ -155,6 +270,7 @@ class localpatternsequenceloader(object):
                 seqs, edges, length, centre)
 
         #Populate seqs with bond length identifiers
+        positions = self.atompositions(seqs)
         for edge in edges:
             if type(edge[0]) is int and type(edge[1]) is int:
                 delta = self.computedelta(edge[0], edge[1])
@@ -165,8 +281,8 @@ class localpatternsequenceloader(object):
             else:
                 delta = 'L'
             letter = delta + edge[2]
-            self.findandreplace(seqs, edge[0], letter)
-            self.findandreplace(seqs, edge[1], 'A')
+            self.replaceatom(seqs, positions, edge[0], letter)
+            self.replaceatom(seqs, positions, edge[1], 'A')
 
         #If required, split the pattern again
         if len(seqs)==1 and len(seqs[0])-2 > 4*window:
@@ -185,22 +301,56 @@ class localpatternsequenceloader(object):
                         break
             #start is now the index of an O atom
             #We now split the seq into chunks, such that each chunk
-            #consists of atoms O, N, X
+            #consists of atoms O, N, X, and name each chunk after its
+            #first bond length identifier, or A if it only has acceptors.
             m = 0 if start%3==0 else start%3-3
-            chunks = [seq[max(i,0):i+3]
-                      for i in range(m, len(seq), 3)]
-            word = []
-            for chunk in chunks:
-                alist = [s=='A' for s in chunk]
-                slist = [type(s) is str for s in chunk]
-                nlist = [a^s for a,s in zip(alist, slist)]
-                if any(nlist):
-                    letter = chunk[nlist.index(True)]
-                elif any(alist):
-                    letter = 'A'
-                else:
-                    letter = 'U'
-                word.append(letter)
+            count = len(range(m, len(seq), 3))
+            word = ['U']*count
+            named = [False]*count
+            for i, x in enumerate(seq):
+                if type(x) is str:
+                    chunk = (i - m)//3
+                    if x != 'A':
+                        if not named[chunk]:
+                            word[chunk] = x
+                            named[chunk] = True
+                    elif not named[chunk]:
+                        word[chunk] = 'A'
             words.extend(word)
             
         return words
+
+    def load_many(self, patterns, window=None):
+        '''Load local pattern sequences from many pattern strings. Each
+        distinct pattern is parsed once.'''
+        loaded = {}
+        words = []
+        for pattern in patterns:
+            if pattern not in loaded:
+                loaded[pattern] = self.load(pattern, window)
+            words.append(list(loaded[pattern]))
+        return words
+
+    def atompositions(self, seqs):
+        '''Map each atom to the (sequence, index) pairs where it occurs,
+        in order.'''
+        positions = {}
+        for k, seq in enumerate(seqs):
+            for i, atom in enumerate(seq):
+                positions.setdefault(atom, []).append((k, i))
+        return positions
+
+    def replaceatom(self, seqs, positions, atom, new):
+        '''Replace the first remaining occurrence of atom in each
+        sequence with new, like findandreplace.'''
+        if type(atom) is not int or atom not in positions:
+            return
+        replaced = set()
+        remaining = []
+        for k, i in positions[atom]:
+            if k in replaced:
+                remaining.append((k, i))
+            else:
+                seqs[k][i] = new
+                replaced.add(k)
+        positions[atom] = remaining
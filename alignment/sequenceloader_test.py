@@ -1,4 +1,9 @@
+import os
+import shutil
+import tempfile
+
 from . import sequenceloader
+from .vocabulary import Vocabulary
 
 class Testlocalpatternsequenceloader(object):
 
@@ -43,3 +48,84 @@ class Testlocalpatternsequenceloader(object):
         pat = '0-6:100-106_H3:103+H6:R-H104:2+HR:5-_LLLL_-5'
         seq = self._loader.load(pat, 3)
         assert seq == ['U', '+6+', 'L-', 'U', 'L+', 'U']
+
+    def test_load_many(self):
+        pats = ['0-4:100-104_H2:102-H100:4-_LLLL_-2',
+                '0-4:100-104_H2:102-H100:4+_LLLL_L',
+                '0-4:100-104_H2:102-H100:4-_LLLL_-2']
+        seqs = self._loader.load_many(pats, 2)
+        assert seqs == [self._loader.load(pat, 2) for pat in pats]
+        assert seqs[0] is not seqs[2]
+
+
+def _clusterline(position, flag, cluster):
+    fields = ['x'] * 24
+    fields[12] = str(position)
+    fields[21] = flag
+    fields[23] = cluster
+    return ' '.join(fields) + '\n'
+
+
+class Testclustersequenceloader(object):
+
+    _loader = sequenceloader.clustersequenceloader()
+
+    def _write(self, dirpath):
+        with open(os.path.join(dirpath, 'T1_a.txt'), 'w') as fh:
+            fh.write(_clusterline(1, 'x__UU', 'R2a'))
+            fh.write(_clusterline(3, 'x__SX', 'R3a'))
+            fh.write(_clusterline(4, 'x__US', 'F3b'))
+        with open(os.path.join(dirpath, 'T1_b.txt'), 'w') as fh:
+            fh.write(_clusterline(2, 'x__SS', 'LRx'))
+        open(os.path.join(dirpath, 'T1_c.txt'), 'w').close()
+
+    def test_load(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            self._write(dirpath)
+            seq = self._loader.load(os.path.join(dirpath, 'T1_a.txt'), 5)
+            assert seq == ['R2a', 'UNB', 'UNB', 'F3b', 'UNB']
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_loaddir_with_cache(self):
+        dirpath = tempfile.mkdtemp()
+        cachefile = dirpath + '.npz'
+        try:
+            self._write(dirpath)
+            vocabulary = Vocabulary()
+            loaded = self._loader.loaddir(dirpath, 4, vocabulary, cachefile)
+            assert sorted(loaded) == ['T1_a', 'T1_b', 'T1_c']
+            for name, seq in loaded.items():
+                expected = self._loader.load(
+                    os.path.join(dirpath, name + '.txt'), 4)
+                assert [vocabulary.decode(c) for c in seq] == expected
+            assert os.path.exists(cachefile)
+
+            # Cached files are not parsed again.
+            loader = sequenceloader.clustersequenceloader()
+            loader.parse = None
+            cached = loader.loaddir(dirpath, 4, vocabulary, cachefile)
+            for name in loaded:
+                assert list(cached[name]) == list(loaded[name])
+        finally:
+            shutil.rmtree(dirpath)
+            if os.path.exists(cachefile):
+                os.remove(cachefile)
+
+    def test_writecache_cleans_up(self):
+        dirpath = tempfile.mkdtemp()
+        cachefile = os.path.join(dirpath, 'cache.npz')
+        try:
+            self._loader.writecache(cachefile, {'a': (0, 0, None, None)})
+        except TypeError:
+            pass
+        else:
+            assert False
+        try:
+            assert os.listdir(dirpath) == []
+            self._loader.writecache(cachefile, {})
+            assert os.listdir(dirpath) == ['cache.npz']
+            assert self._loader.readcache(cachefile) == {}
+        finally:
+            shutil.rmtree(dirpath)
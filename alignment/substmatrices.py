@@ -7,13 +7,54 @@
 
 from itertools import combinations_with_replacement as cwr
 from pkg_resources import resource_filename
+import functools
 import pickle
 import math
 
+import numpy
 
 import alignment.conv as conv
 
 
+# Matrices built so far in this process, keyed by name, parameters and
+# alphabet. Shared by all SubstitutionMatrices instances.
+cache = {}
+
+
+def clearcache():
+    '''Forget all cached matrices.'''
+    cache.clear()
+
+
+def cachedmatrix(build):
+    '''Cache the matrices built by the decorated method. Callers get their
+    own copy of the cached dict.'''
+    @functools.wraps(build)
+    def matrix(self, *args, **kwargs):
+        key = (build.__name__, args, tuple(sorted(kwargs.items())),
+               tuple(self.alphabet))
+        try:
+            built = cache[key]
+        except KeyError:
+            built = cache[key] = build(self, *args, **kwargs)
+        return dict(built)
+    return matrix
+
+
+def clusterdistances(modes, alphabet):
+    '''Dense matrix of the distances between the given clusters. Clusters
+    without a mode, most likely of the type '??x' or 'NC-'/'UNB', are
+    3.14 away from all others.'''
+    known = [i for i, k in enumerate(alphabet) if k in modes]
+    rotations = conv.ev2mat_batch(
+        [modes[alphabet[i]][0] for i in known],
+        numpy.reshape([modes[alphabet[i]][1] for i in known], (-1, 3)))
+    dists = numpy.full((len(alphabet), len(alphabet)), 3.14)
+    dists[numpy.ix_(known, known)] = conv.so3dist_pairwise(rotations,
+                                                           rotations)
+    return dists
+
+
 class SubstitutionMatrices(object):
     alphabet_cluster = [
         'F2a', 'F2x',
@@ -74,6 +115,7 @@ class SubstitutionMatrices(object):
         self.alphabet = alphabet
 
     @property
+    @cachedmatrix
     def simplematrix(self):
         a2 = cwr(self.alphabet, 2)
         matrix = {k: (-1)**int(k[0] != k[1]) for k in a2}
@@ -83,29 +125,28 @@ class SubstitutionMatrices(object):
     def clusterdistance(self):
         fname = resource_filename('alignment',
                                   'config/clustermode.pkl')
+        return self.loadclustermatrix(fname, tuple(self.alphabet_cluster))
+
+    @cachedmatrix
+    def loadclustermatrix(self, fname, alphabet=None):
+        '''Cluster distance matrix from a pickled dict of cluster modes,
+        given as (angle, axis) pairs. The alphabet defaults to the sorted
+        cluster names.'''
         with open(fname, 'rb') as f:
             modes = pickle.load(f)
-        a2 = cwr(self.alphabet_cluster, 2)
+        if alphabet is None:
+            alphabet = sorted(modes)
+        dists = clusterdistances(modes, alphabet)
         matrix = {}
-        for k in a2:
-            if k[0] == k[1]:
-                dist = -1  # this gives match score = 1
+        for i, j in cwr(range(len(alphabet)), 2):
+            if i == j:
+                score = 1
             else:
-                try:
-                    first = modes[k[0]]
-                    second = modes[k[1]]
-                    dist = conv.so3dist(
-                        conv.ev2mat(first[0], first[1]),
-                        conv.ev2mat(second[0], second[1])
-                    )
-                except KeyError:
-                    # The given key is not found in the dict of modes.
-                    # Most likely because the key is of the type '??x'
-                    # or 'NC-'/'UNB'
-                    dist = 3.14
-            matrix[k] = -1 * dist
+                score = -1 * dists[i, j]
+            matrix[(alphabet[i], alphabet[j])] = score
         return matrix
 
+    @cachedmatrix
     def loadproteinmatrix(self, fname):
         with open(fname) as fh:
             lines = fh.readlines()
@@ -134,12 +175,14 @@ class SubstitutionMatrices(object):
         return matrix
         
     @property
+    @cachedmatrix
     def blosum62(self):
         fname = resource_filename('alignment',
                                   'config/blosum62.txt')
         return self.loadproteinmatrix(fname)
 
     @property
+    @cachedmatrix
     def blosum62plus(self):
         fname = resource_filename('alignment',
                                   'config/blosum62.txt')
@@ -155,6 +198,7 @@ class SubstitutionMatrices(object):
         mat.update(append)
         return mat
 
+    @cachedmatrix
     def blosum62plus2(self, match=4, mismatch=-4):
         fname = resource_filename('alignment',
                                   'config/blosum62.txt')
@@ -171,24 +215,28 @@ class SubstitutionMatrices(object):
         return mat
     
     @property
+    @cachedmatrix
     def blosum80(self):
         fname = resource_filename('alignment',
                                   'config/blosum80.txt')
         return self.loadproteinmatrix(fname)
     
     @property
+    @cachedmatrix
     def blosum90(self):
         fname = resource_filename('alignment',
                                   'config/blosum90.txt')
         return self.loadproteinmatrix(fname)
 
     @property
+    @cachedmatrix
     def betapairs(self):
         fname = resource_filename('alignment',
                                   'config/bstrands.txt')
         return self.loadproteinmatrix(fname)
 
     @property
+    @cachedmatrix
     def bondlength(self):
         a2 = cwr(self.alphabet_length, 2)
         matrix = {}
@@ -214,6 +262,7 @@ class SubstitutionMatrices(object):
         return matrix
 
     @property
+    @cachedmatrix
     def bondlength2(self):
         a2 = cwr(self.alphabet_length, 2)
         matrix = {}
@@ -239,6 +288,7 @@ class SubstitutionMatrices(object):
         return matrix
 
     @property
+    @cachedmatrix
     def bondlength3(self):
         a2 = cwr(self.alphabet_length, 2)
         matrix = {}
@@ -264,6 +314,7 @@ class SubstitutionMatrices(object):
         return matrix
 
     @property
+    @cachedmatrix
     def bondlength4(self):
         a2 = cwr(self.alphabet_length, 2)
         matrix = {}
@@ -313,3 +364,28 @@ class SubstitutionMatrices(object):
             return self.blosum62plus
         else:
             raise KeyError('{} not found.'.format(matrixname))
+
+    def getarray(self, matrixname, alphabet=None):
+        '''Dense score array of the given matrix, with rows and columns in
+        the order of alphabet (by default the alphabet of this instance).
+        Missing pairs are NaN. The array is cached and read-only.'''
+        if alphabet is None:
+            alphabet = self.alphabet
+        key = ('getarray', matrixname, tuple(alphabet))
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        matrix = self.getmatrix(matrixname)
+        index = {a: i for i, a in enumerate(alphabet)}
+        array = numpy.full((len(alphabet), len(alphabet)), numpy.nan)
+        pairs = [(index[a], index[b], score)
+                 for (a, b), score in matrix.items()
+                 if a in index and b in index]
+        for i, j, score in pairs:
+            array[j, i] = score
+        for i, j, score in pairs:
+            array[i, j] = score
+        array.setflags(write=False)
+        cache[key] = array
+        return array
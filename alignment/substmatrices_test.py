@@ -1,3 +1,8 @@
+import pickle
+import tempfile
+
+import numpy
+
 from .vocabulary import Vocabulary
 from .sequence import Sequence
 from .sequencealigner import MatrixScoring
@@ -5,6 +10,9 @@ from .sequencealigner import GlobalSequenceAligner
 from .sequencealigner import StrictGlobalSequenceAligner
 from .sequencealigner import LocalSequenceAligner
 from .alignmenthelper import AlignmentHelper
+from . import alignmenthelper
+from . import substmatrices
+from . import conv
 
 
 DEFAULT_SUBST_MATRIX = {
@@ -68,3 +76,181 @@ def test_alignmenthelper():
     assert alignments[0].percentSimilarity() == 2.0 / 4.0 * 100.0
     assert alignments[0].percentGap() == 2.0 / 4.0 * 100.0
     assert score == DEFAULT_MATCH_SCORE * 2 + DEFAULT_GAP_SCORE * 2
+
+
+def test_alignmenthelper_cached_sessions():
+    alignmenthelper.clearsessions()
+    helper = AlignmentHelper()
+    for _ in range(3):
+        score = helper.alignStrict('abc', 'bac',
+                                   substMatrix=DEFAULT_SUBST_MATRIX,
+                                   gapScore=DEFAULT_GAP_SCORE, btrace=False)
+        assert score == 4 + DEFAULT_GAP_SCORE * 2
+    assert len(alignmenthelper.sessions) == 1
+    assert helper.alignStrict('abc', 'bac', substMatrix=DEFAULT_SUBST_MATRIX,
+                              gapScore=-3, btrace=False) == -1
+    score, alignments = helper.alignLocal('cabc', 'ab',
+                                          substMatrix=DEFAULT_SUBST_MATRIX)
+    assert score == 4
+    assert len(alignmenthelper.sessions) == 3
+    for k in range(alignmenthelper.MAX_SESSIONS):
+        helper.alignStrict('ab', 'ab', matchScore=k, mismatchScore=-1,
+                           btrace=False)
+    assert len(alignmenthelper.sessions) <= alignmenthelper.MAX_SESSIONS
+    alignmenthelper.clearsessions()
+    assert not alignmenthelper.sessions
+
+
+def test_alignmenthelper_session():
+    helper = AlignmentHelper(substMatrix=DEFAULT_SUBST_MATRIX,
+                             gapScore=DEFAULT_GAP_SCORE, mode='strict')
+    score, alignments = helper.align('abc', 'bac')
+    assert score == 4 + DEFAULT_GAP_SCORE * 2
+    assert str(alignments[0].second) == 'b a - c'
+    assert helper.score('abc', 'bac') == score
+    seconds = ['bac', 'abc', 'cab', 'a']
+    assert list(helper.score_many('abc', seconds)) == \
+        [alignstrict('abc', s, DEFAULT_SUBST_MATRIX)[0] for s in seconds]
+    # The vocabulary is frozen to the matrix alphabet.
+    size = len(helper.vocabulary)
+    try:
+        helper.score('abd', 'abc')
+    except KeyError:
+        pass
+    else:
+        assert False
+    assert len(helper.vocabulary) == size
+
+    helper = AlignmentHelper(matchScore=DEFAULT_MATCH_SCORE,
+                             mismatchScore=DEFAULT_MISMATCH_SCORE,
+                             gapScore=DEFAULT_GAP_SCORE, mode='local')
+    score, alignments = helper.align('xaby', 'ab')
+    assert score == DEFAULT_MATCH_SCORE * 2
+    assert str(alignments[0].first) == 'a b'
+    try:
+        AlignmentHelper().score('ab', 'ab')
+    except TypeError:
+        pass
+    else:
+        assert False
+
+
+def test_matrixscoring_score_rows():
+    voc = Vocabulary()
+    scoring = MatrixScoring(voc.encodeScoreMatrix(DEFAULT_SUBST_MATRIX))
+    first = voc.encodeSequence(Sequence('abcca'))
+    second = voc.encodeSequence(Sequence('cab'))
+    rows = scoring.score_rows(first.elements, second.elements)
+    assert rows.shape == (5, 3)
+    for i in range(5):
+        for j in range(3):
+            assert rows[i, j] == scoring(first[i], second[j])
+    assert numpy.array_equal(scoring.table, scoring.table.T, equal_nan=True)
+
+
+def test_matrixscoring_missing_pair():
+    scoring = MatrixScoring({(1, 1): 1, (2, 2): 1})
+    try:
+        scoring.score_rows(numpy.array([1]), numpy.array([2]))
+    except KeyError:
+        pass
+    else:
+        assert False
+    try:
+        scoring(1, 3)
+    except KeyError:
+        pass
+    else:
+        assert False
+
+
+def test_matrixscoring_sparse_codes():
+    scoring = MatrixScoring({(100000, 100000): 1, (5, 100000): 2, (5, 5): 3})
+    assert scoring.table.shape == (2, 2)
+    assert scoring(100000, 5) == 2
+    rows = scoring.score_rows(numpy.array([5, 100000]),
+                              numpy.array([100000, 5, 5]))
+    assert rows.tolist() == [[2, 3, 3], [1, 2, 2]]
+    scores = scoring.pair_scores(numpy.array([5, 100000]),
+                                 numpy.array([100000, 5, 5]))
+    assert scores(numpy.array([0, 1]), numpy.array([2, 0])).tolist() == [3, 1]
+    for first, second in ((5, 6), (7, 5), (5, 200000)):
+        try:
+            scoring(first, second)
+        except KeyError:
+            pass
+        else:
+            assert False
+        try:
+            scoring.score_rows(numpy.array([first]), numpy.array([second]))
+        except KeyError:
+            pass
+        else:
+            assert False
+        try:
+            scoring.pair_scores(numpy.array([first]),
+                                numpy.array([second]))(numpy.array([0]),
+                                                       numpy.array([0]))
+        except KeyError:
+            pass
+        else:
+            assert False
+
+
+def test_matrices_are_cached():
+    substmatrices.clearcache()
+    matrices = substmatrices.SubstitutionMatrices('length')
+    matrix = matrices.bondlength
+    matrix[('U', 'U')] = 100
+    assert matrices.getmatrix('bondlength')[('U', 'U')] == 1
+    assert len(substmatrices.cache) == 1
+    assert matrices.blosum62plus2(3, -3)[('@', '@')] == 3
+    assert matrices.blosum62plus2()[('@', '@')] == 4
+    substmatrices.clearcache()
+    assert not substmatrices.cache
+
+
+def test_getarray():
+    matrices = substmatrices.SubstitutionMatrices('length')
+    array = matrices.getarray('bondlength')
+    matrix = matrices.bondlength
+    alphabet = matrices.alphabet_length
+    assert array.shape == (len(alphabet), len(alphabet))
+    assert not array.flags.writeable
+    for (a, b), score in matrix.items():
+        assert array[alphabet.index(a), alphabet.index(b)] == score
+        assert array[alphabet.index(b), alphabet.index(a)] == score
+    assert matrices.getarray('bondlength') is array
+
+
+def test_clusterdistance():
+    matrices = substmatrices.SubstitutionMatrices()
+    matrix = matrices.clusterdistance
+    modes = {'R2a': (3.03, (-0.28, -0.78, 0.56)),
+             'R2b': (2.86, (0.22, 0.86, 0.46)),
+             'R2c': (2.46, (-0.33, -0.73, -0.6))}
+    alphabet = ['R2a', 'R2b', 'R2c', 'R2x']
+    dists = substmatrices.clusterdistances(modes, alphabet)
+    for i, a in enumerate(alphabet):
+        for j, b in enumerate(alphabet):
+            if a == 'R2x' or b == 'R2x':
+                expected = 3.14
+            else:
+                expected = conv.so3dist(conv.ev2mat(*modes[a]),
+                                        conv.ev2mat(*modes[b]))
+            # acos loses precision next to zero distances.
+            assert abs(dists[i, j] - expected) < 1e-6
+    assert matrix[('R2a', 'R2a')] == 1
+    assert abs(matrix[('R2a', 'R2b')] + dists[0, 1]) < 1e-9
+    assert matrix[('R2a', 'R2x')] == -3.14
+
+
+def test_loadclustermatrix():
+    modes = {'b': (1.0, (0.0, 0.0, 2.0)), 'a': (0.5, (0.0, 0.0, 1.0))}
+    with tempfile.NamedTemporaryFile(suffix='.pkl') as fh:
+        pickle.dump(modes, fh)
+        fh.flush()
+        matrix = substmatrices.SubstitutionMatrices().loadclustermatrix(
+            fh.name)
+    assert sorted(matrix) == [('a', 'a'), ('a', 'b'), ('b', 'b')]
+    assert abs(matrix[('a', 'b')] + 0.5) < 1e-9
@@ -1,7 +1,15 @@
+import itertools
+
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
+
 from .sequence import GAP_ELEMENT
 from .sequence import GAP_CODE
 from .sequence import Sequence
 from .sequence import EncodedSequence
+from .sequence import codetype
 from .profile import SoftElement
 from .profile import Profile
 
@@ -9,9 +17,47 @@ from .profile import Profile
 # Vocabulary ------------------------------------------------------------------
 
 class Vocabulary(object):
-    def __init__(self):
+    '''Maps elements to integer codes and back.
+
+    A frozen vocabulary raises KeyError on unknown elements instead of
+    adding them, so copies of it, e.g. in worker processes, always agree on
+    the codes.
+    '''
+
+    def __init__(self, elements=None):
         self.__elementToCode = {GAP_ELEMENT: GAP_CODE}
         self.__codeToElement = {GAP_CODE: GAP_ELEMENT}
+        self.__table = None
+        self.frozen = False
+        if elements is not None:
+            for element in elements:
+                self.encode(element)
+
+    def freeze(self):
+        self.frozen = True
+        self.table()
+        return self
+
+    def table(self):
+        '''Object array of the elements, indexed by their codes.'''
+        if self.__table is None or len(self.__table) != len(self):
+            table = numpy.empty(len(self), object)
+            for code, element in self.__codeToElement.items():
+                table[code] = element
+            table.setflags(write=False)
+            self.__table = table
+        return self.__table
+
+    def __getstate__(self):
+        # Unpickled arrays are writeable, so the table is rebuilt instead.
+        state = dict(self.__dict__)
+        state['_Vocabulary__table'] = None
+        return state
+
+    def dtype(self):
+        '''Smallest unsigned dtype that holds the codes of the
+        vocabulary.'''
+        return codetype(len(self))
 
     def has(self, element):
         return element in self.__elementToCode
@@ -22,6 +68,9 @@ class Vocabulary(object):
     def encode(self, element):
         code = self.__elementToCode.get(element)
         if code is None:
+            if self.frozen:
+                raise KeyError(
+                    '%r is not in the frozen vocabulary' % (element,))
             code = len(self.__elementToCode)
             self.__elementToCode[element] = code
             self.__codeToElement[code] = element
@@ -36,10 +85,8 @@ class Vocabulary(object):
                 % code)
 
     def encodeSequence(self, sequence):
-        encoded = EncodedSequence(len(sequence), id=sequence.id)
-        for element in sequence:
-            encoded.push(self.encode(element))
-        return encoded
+        codes = [self.encode(element) for element in sequence]
+        return EncodedSequence(codes, id=sequence.id, dtype=self.dtype())
 
     def decodeSequence(self, sequence):
         decoded = Sequence(id=sequence.id)
@@ -47,6 +94,49 @@ class Vocabulary(object):
             decoded.push(self.decode(code))
         return decoded
 
+    def encode_many(self, sequences):
+        '''Encodes a batch of sequences with a single lookup over all of
+        their elements.'''
+        sequences = list(sequences)
+        lengths = [len(s) for s in sequences]
+        total = sum(lengths)
+        elements = list(itertools.chain.from_iterable(sequences))
+        codes = numpy.fromiter(
+            map(self.__elementToCode.get, elements, itertools.repeat(-1)),
+            int, total)
+        # Unknown elements get new codes in order of appearance, as in
+        # encodeSequence.
+        for i in numpy.flatnonzero(codes < 0):
+            codes[i] = self.encode(elements[i])
+        codes = codes.astype(self.dtype())
+        ends = numpy.cumsum(lengths)
+        return [EncodedSequence(codes[end - length:end],
+                                id=getattr(s, 'id', None))
+                for s, length, end in zip(sequences, lengths, ends)]
+
+    def decode_many(self, sequences):
+        '''Decodes a batch of encoded sequences with a single lookup in the
+        code table.'''
+        sequences = list(sequences)
+        if not sequences:
+            return []
+        codes = numpy.concatenate([numpy.asarray(s.elements, int)
+                                   for s in sequences])
+        table = self.table()
+        unknown = (codes < 0) | (codes >= len(table))
+        if unknown.any():
+            raise KeyError(
+                'there is no elements in the vocabulary encoded as %r'
+                % int(codes[unknown][0]))
+        elements = table[codes].tolist()
+        decoded = []
+        start = 0
+        for s in sequences:
+            end = start + len(s.elements)
+            decoded.append(Sequence(elements[start:end], id=s.id))
+            start = end
+        return decoded
+
     def encodeScoreMatrix(self, submatrix):
         encoded = {}
         for k in submatrix:
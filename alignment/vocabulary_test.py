@@ -0,0 +1,77 @@
+import pickle
+
+import numpy
+
+from .vocabulary import Vocabulary
+from .sequence import Sequence
+from .sequence import EncodedSequence
+
+
+def test_encode_many():
+    sequences = [Sequence('abca', id='x'), Sequence('dab'), Sequence(''),
+                 Sequence('e')]
+    voc = Vocabulary()
+    encoded = voc.encode_many(sequences)
+    expected = Vocabulary()
+    for s, e in zip(sequences, encoded):
+        assert e.key() == expected.encodeSequence(s).key()
+        assert len(e) == len(s)
+        assert e.id == s.id
+    assert voc.elements() == expected.elements()
+    assert voc.encode_many([]) == []
+
+
+def test_decode_many():
+    voc = Vocabulary()
+    sequences = [Sequence('abca', id='x'), Sequence(''), Sequence('dab')]
+    decoded = voc.decode_many(voc.encode_many(sequences))
+    assert [d.elements for d in decoded] == [s.elements for s in sequences]
+    assert [d.id for d in decoded] == ['x', None, None]
+    for code in (-1, len(voc)):
+        try:
+            voc.decode_many([EncodedSequence([1]), EncodedSequence([code])])
+        except KeyError:
+            pass
+        else:
+            assert False
+
+
+def test_frozen():
+    voc = Vocabulary('abc').freeze()
+    assert list(voc.encode_many(['cab'])[0]) == [3, 1, 2]
+    for encode, unknown in ((voc.encode, 'd'),
+                            (voc.encodeSequence, Sequence('ad')),
+                            (voc.encode_many, ['ab', 'd'])):
+        try:
+            encode(unknown)
+        except KeyError:
+            pass
+        else:
+            assert False
+    assert len(voc) == 4
+    copy = pickle.loads(pickle.dumps(voc))
+    assert copy.frozen
+    assert copy.elements() == voc.elements()
+    assert not copy.table().flags.writeable
+
+
+def test_compact_dtype():
+    voc = Vocabulary(range(255))
+    first = voc.encodeSequence(Sequence([1, 2, 3]))
+    assert first.elements.dtype == numpy.uint8
+    assert voc.encode_many([[1, 2, 3]])[0] == first
+    assert hash(voc.encode_many([[1, 2, 3]])[0]) == hash(first)
+    assert first != voc.encodeSequence(Sequence([3, 2, 1]))
+    assert first.reversed().elements.dtype == numpy.uint8
+    # The dtype grows with the vocabulary.
+    second = voc.encode_many([[300, 1]])[0]
+    assert second.elements.dtype == numpy.uint16
+    assert list(second) == [256, 2]
+    assert voc.decode_many([first, second])[1].elements == [300, 1]
+    # Equality and hashing only depend on the codes.
+    wide = voc.encodeSequence(Sequence([1, 2, 3]))
+    assert wide.elements.dtype == numpy.uint16
+    for other in (wide, EncodedSequence([2, 3, 4])):
+        assert other == first
+        assert hash(other) == hash(first)
+        assert len({first, other}) == 1
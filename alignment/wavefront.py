@@ -0,0 +1,544 @@
+try:
+    import numpypy as numpy
+except ImportError:
+    import numpy
+
+
+# Wavefront -------------------------------------------------------------------
+#
+# The alignment recurrences only look at the left, upper and upper-left
+# neighbours of a cell, so all cells on one anti-diagonal (i + j == d) are
+# independent of each other and can be computed with a single array operation.
+# Every cell is computed with exactly the same floating point operations as
+# the scalar recurrence, hence the resulting matrices are bit-identical.
+#
+# Gap scores are position dependent: `rowGaps[i]` is the score of a horizontal
+# move (a gap on the first sequence) into a cell of row i, and `colGaps[j]` is
+# the score of a vertical move (a gap on the second sequence) into a cell of
+# column j.
+#
+# Traceback matrices hold, for every cell, a bitmask of the moves into the
+# cell that achieve its value.
+#
+# A band (lo, hi) restricts the computation to the cells with
+# lo <= j - i <= hi. Cells outside the band are -inf, and a BandMatrix only
+# stores the cells within it.
+
+MATCH = 1
+GAP_FIRST = 2
+GAP_SECOND = 4
+
+# Largest block, in cells, that linear space backtraces solve directly.
+BLOCK_SIZE = 1 << 16
+
+# Largest matrix, in cells, that fill() computes cell by cell, where the
+# array operations on short anti-diagonals cost more than they save.
+SCALAR_SIZE = 1 << 9
+
+# Cells of consecutive anti-diagonals of which diagonals() looks up the
+# substitution scores at once. Anti-diagonals of more than 1/32 of that
+# look up their own.
+SCORE_BLOCK = 1 << 14
+
+
+def band(m, n, width):
+    '''Band of the cells within width of the diagonals through the corners
+    of an m x n matrix. n can also be an array of column counts.'''
+    return numpy.minimum(0, n - m) - width, numpy.maximum(0, n - m) + width
+
+
+def extent(d, m, n, band=None):
+    '''First and last row indices of the cells on anti-diagonal d of an
+    m x n matrix.'''
+    lo = max(0, d - n + 1)
+    hi = min(m - 1, d)
+    if band is not None:
+        lo = max(lo, -((band[1] - d) // 2))
+        hi = min(hi, (d - band[0]) // 2)
+    return lo, hi
+
+
+def extents(m, n, band=None):
+    '''extent() of all anti-diagonals of an m x n matrix, as arrays.'''
+    d = numpy.arange(m + n - 1)
+    lo = numpy.maximum(0, d - n + 1)
+    hi = numpy.minimum(m - 1, d)
+    if band is not None:
+        lo = numpy.maximum(lo, -((band[1] - d) // 2))
+        hi = numpy.minimum(hi, (d - band[0]) // 2)
+    return lo, hi
+
+
+def diagonal(d, m, n, band=None):
+    '''Row indices of the inner cells on anti-diagonal d of an m x n
+    matrix.'''
+    lo, hi = extent(d, m, n, band)
+    return numpy.arange(max(1, lo), min(d - 1, hi) + 1)
+
+
+def boundary(f, rowGaps, colGaps, floor=None, trace=None):
+    '''Initialize the first row and the first column of f.'''
+    m, n = f.shape
+    if trace is not None:
+        trace[0, 1:] = GAP_FIRST
+        trace[1:, 0] = GAP_SECOND
+    for j in range(1, n):
+        f[0, j] = f[0, j - 1] + rowGaps[0]
+        if floor is not None:
+            f[0, j] = max(floor, f[0, j])
+    for i in range(1, m):
+        f[i, 0] = f[i - 1, 0] + colGaps[0]
+        if floor is not None:
+            f[i, 0] = max(floor, f[i, 0])
+
+
+def fill(f, s, rowGaps, colGaps, floor=None, trace=None):
+    '''Fill the inner cells of f, and optionally of the traceback matrix,
+    in place.
+
+    s is the (m-1) x (n-1) substitution score block, with s[i, j] being the
+    score of aligning the i-th element of the first sequence with the j-th
+    element of the second sequence. It can also be a function returning the
+    substitution scores of the cells (i, j) given as arrays of row and column
+    indices.
+    '''
+    m, n = f.shape
+    if m < 2 or n < 2:
+        return f
+    if m * n <= SCALAR_SIZE and not callable(s):
+        return fillScalar(f, s, rowGaps, colGaps, floor, trace)
+    flat = f.reshape(-1)
+    if trace is not None:
+        tflat = trace.reshape(-1)
+    if not callable(s):
+        sflat = numpy.ascontiguousarray(s, dtype=f.dtype).reshape(-1)
+    for d in range(2, m + n - 1):
+        i = diagonal(d, m, n)
+        k = i * n + (d - i)
+
+        # Match elements.
+        if callable(s):
+            ab = flat[k - n - 1] + s(i, d - i)
+        else:
+            ab = flat[k - n - 1] + sflat[k - n - i]
+
+        # Gap on first sequence.
+        ga = flat[k - 1] + rowGaps[i]
+
+        # Gap on second sequence.
+        gb = flat[k - n] + colGaps[d - i]
+
+        best = numpy.maximum(ab, numpy.maximum(ga, gb))
+        if floor is not None:
+            best = numpy.maximum(floor, best)
+        flat[k] = best
+        if trace is not None:
+            tflat[k] = (best == ab) * MATCH | (best == ga) * GAP_FIRST \
+                | (best == gb) * GAP_SECOND
+    return f
+
+
+def fillScalar(f, s, rowGaps, colGaps, floor=None, trace=None):
+    '''fill() for small matrices, one cell at a time.'''
+    m, n = f.shape
+    rows = f.tolist()
+    s = numpy.asarray(s, dtype=f.dtype).tolist()
+    rowGaps = numpy.asarray(rowGaps, dtype=f.dtype).tolist()
+    colGaps = numpy.asarray(colGaps, dtype=f.dtype).tolist()
+    if trace is not None:
+        bits = trace.tolist()
+    for i in range(1, m):
+        previous = rows[i - 1]
+        current = rows[i]
+        scores = s[i - 1]
+        rowGap = rowGaps[i]
+        for j in range(1, n):
+            # Match elements, gap on first sequence, gap on second sequence.
+            ab = previous[j - 1] + scores[j - 1]
+            ga = current[j - 1] + rowGap
+            gb = previous[j] + colGaps[j]
+            best = gb if gb > ga else ga
+            if ab >= best:
+                best = ab
+            if floor is not None and floor >= best:
+                best = floor
+            current[j] = best
+            if trace is not None:
+                bits[i][j] = (best == ab) * MATCH | (best == ga) * GAP_FIRST \
+                    | (best == gb) * GAP_SECOND
+    f[...] = rows
+    if trace is not None:
+        trace[...] = bits
+    return f
+
+
+def diagonals(m, n, scores, rowGaps, colGaps, floor=None, band=None):
+    '''Iterate over the anti-diagonals of the m x n matrix that fill() would
+    produce, keeping only the last three of them in memory.
+
+    Yields (d, lo, hi, values) where values[i] holds cell (i, d - i) for
+    lo <= i <= hi. The values array is reused for later diagonals.
+    scores(i, j) must return the substitution scores of the cells (i, j)
+    given as arrays of row and column indices. With a band, only the cells
+    within it are computed, and the cells outside of it are -inf.
+    '''
+    older = numpy.zeros(m)
+    previous = numpy.zeros(m)
+    current = numpy.zeros(m)
+    # The inner cells of anti-diagonal d are in the rows first[d] to
+    # last[d] - 1, and ends[d] of them are on the diagonals up to d.
+    lows, highs = extents(m, n, band)
+    first = numpy.maximum(1, lows)
+    last = numpy.maximum(first, numpy.minimum(
+        numpy.arange(m + n - 1), highs + 1))
+    counts = last - first
+    ends = numpy.cumsum(counts)
+    rows = numpy.arange(m)
+    block = None
+    blockEnd = 0
+    yield 0, 0, 0, current
+    for d, lo, hi, a, b, end in zip(range(1, m + n - 1), lows[1:].tolist(),
+                                    highs[1:].tolist(), first[1:].tolist(),
+                                    last[1:].tolist(), ends[1:].tolist()):
+        older, previous, current = previous, current, older
+        if band is not None:
+            # Cells just outside of the band are read by the next diagonal.
+            if lo > 0:
+                current[lo - 1] = -numpy.inf
+            if hi < m - 1:
+                current[hi + 1] = -numpy.inf
+        if 32 * (b - a) >= SCORE_BLOCK:
+            i = rows[a:b]
+            s = scores(i, d - i)
+        elif a < b:
+            start = end - (b - a)
+            if end > blockEnd:
+                # Substitution scores of the inner cells of this and the
+                # following diagonals.
+                stop = max(d, int(numpy.searchsorted(
+                    ends, start + SCORE_BLOCK, 'right')) - 1)
+                cellDiagonals = numpy.repeat(numpy.arange(d, stop + 1),
+                                             counts[d:stop + 1])
+                i = numpy.arange(start, ends[stop]) - ends[cellDiagonals] \
+                    + last[cellDiagonals]
+                block = scores(i, cellDiagonals - i)
+                blockStart, blockEnd = start, ends[stop]
+            s = block[start - blockStart:end - blockStart]
+        if a < b:
+            # Match elements.
+            ab = older[a - 1:b - 1] + s
+
+            # Gap on first sequence.
+            ga = previous[a:b] + rowGaps[a:b]
+
+            # Gap on second sequence.
+            gb = previous[a - 1:b - 1] + colGaps[d - b + 1:d - a + 1][::-1]
+
+            value = numpy.maximum(ab, numpy.maximum(ga, gb))
+            if floor is not None:
+                value = numpy.maximum(floor, value)
+            current[a:b] = value
+        if d < n and lo == 0:
+            current[0] = previous[0] + rowGaps[0]
+            if floor is not None:
+                current[0] = max(floor, current[0])
+        if d < m and hi == d:
+            current[d] = previous[d - 1] + colGaps[0]
+            if floor is not None:
+                current[d] = max(floor, current[d])
+        yield d, lo, hi, current
+
+
+def shorter(m, n, scores, rowGaps, colGaps, band=None):
+    '''Arguments of the transposed matrix if it has fewer rows, so that
+    the diagonals are kept along the shorter sequence.'''
+    if m <= n:
+        return m, n, scores, rowGaps, colGaps, band
+    if band is not None:
+        band = (-band[1], -band[0])
+    return n, m, lambda i, j: scores(j, i), colGaps, rowGaps, band
+
+
+def sweep(m, n, scores, rowGaps, colGaps, floor=None, band=None):
+    '''Compute the last cell and the maximum of the m x n matrix that fill()
+    would produce in O(min(m, n)) memory, optionally within a band.'''
+    m, n, scores, rowGaps, colGaps, band = shorter(
+        m, n, scores, rowGaps, colGaps, band)
+    best = None
+    for d, lo, hi, values in diagonals(m, n, scores, rowGaps, colGaps,
+                                       floor, band):
+        if lo <= hi:
+            top = values[lo:hi + 1].max()
+            if best is None or top > best:
+                best = top
+    return values[m - 1], best
+
+
+def lastCell(m, n, scores, rowGaps, colGaps, floor=None, band=None):
+    '''Compute only the last cell of the m x n matrix that fill() would
+    produce in O(min(m, n)) memory, optionally within a band.'''
+    m, n, scores, rowGaps, colGaps, band = shorter(
+        m, n, scores, rowGaps, colGaps, band)
+    for d, lo, hi, values in diagonals(m, n, scores, rowGaps, colGaps,
+                                       floor, band):
+        pass
+    return values[m - 1]
+
+
+def lastRow(m, n, scores, rowGaps, colGaps, floor=None):
+    '''Compute the last row of the m x n matrix that fill() would produce
+    in O(m + n) memory.'''
+    row = numpy.zeros(n)
+    for d, lo, hi, values in diagonals(m, n, scores, rowGaps, colGaps,
+                                       floor):
+        if hi == m - 1:
+            row[d - hi] = values[hi]
+    return row
+
+
+def countPaths(trace, terminal):
+    '''Count, for every cell, the paths that follow the traceback moves from
+    the cell to a terminal cell. Counts are arbitrary precision integers.'''
+    m, n = trace.shape
+    counts = numpy.zeros((m, n), object)
+    flat = counts.reshape(-1)
+    tflat = trace.reshape(-1)
+    terminal = terminal.reshape(-1)
+    for d in range(m + n - 1):
+        i = numpy.arange(max(0, d - n + 1), min(m - 1, d) + 1)
+        k = i * n + (d - i)
+        bits = tflat[k]
+        count = numpy.where(bits & MATCH,
+                            flat[numpy.maximum(k - n - 1, 0)], 0) \
+            + numpy.where(bits & GAP_FIRST, flat[numpy.maximum(k - 1, 0)], 0) \
+            + numpy.where(bits & GAP_SECOND,
+                          flat[numpy.maximum(k - n, 0)], 0)
+        flat[k] = numpy.where(terminal[k], 1, count)
+    return counts
+
+
+def markPaths(trace, terminal, starts):
+    '''Mark the cells visited by the paths that follow the traceback moves
+    from the start cells to a terminal cell.'''
+    m, n = trace.shape
+    mask = numpy.zeros((m, n), bool)
+    for i, j in starts:
+        mask[i, j] = True
+    flat = mask.reshape(-1)
+    tflat = trace.reshape(-1)
+    terminal = terminal.reshape(-1)
+    for d in range(m + n - 2, 0, -1):
+        i = numpy.arange(max(0, d - n + 1), min(m - 1, d) + 1)
+        k = i * n + (d - i)
+        k = k[flat[k] & ~terminal[k]]
+        bits = tflat[k]
+        flat[k[(bits & MATCH) > 0] - n - 1] = True
+        flat[k[(bits & GAP_FIRST) > 0] - 1] = True
+        flat[k[(bits & GAP_SECOND) > 0] - n] = True
+    return mask
+
+
+class BandMatrix(object):
+    '''m x n matrix of which only the cells within a band are stored. The
+    cells are kept by anti-diagonal, so that every anti-diagonal is one
+    contiguous row of the storage, with a padding cell on either side, and
+    all other cells read as value.'''
+
+    def __init__(self, m, n, band, value=0, dtype=float):
+        self.shape = (m, n)
+        self.band = band
+        self.value = value
+        self.data = numpy.full((m + n - 1, (band[1] - band[0]) // 2 + 3),
+                               value, dtype)
+
+    def first(self, d):
+        '''Row of the first cell of the band on anti-diagonal d, which is
+        stored in column 1.'''
+        return -((self.band[1] - d) // 2)
+
+    def cells(self):
+        '''Rows, columns and storage indices of the cells in the band.'''
+        m, n = self.shape
+        d = numpy.arange(m + n - 1)[:, None]
+        k = numpy.arange(1, self.data.shape[1] - 1)
+        i = self.first(d) + k - 1
+        j = d - i
+        inside = (i >= 0) & (i < m) & (j >= 0) & (j < n) \
+            & (j - i >= self.band[0])
+        d = numpy.broadcast_to(d, i.shape)[inside]
+        k = numpy.broadcast_to(k, i.shape)[inside]
+        return i[inside], j[inside], d, k
+
+    def __getitem__(self, cell):
+        m, n = self.shape
+        i, j = cell
+        i = i + m if i < 0 else i
+        j = j + n if j < 0 else j
+        if 0 <= i < m and 0 <= j < n \
+                and self.band[0] <= j - i <= self.band[1]:
+            return self.data[i + j, i - self.first(i + j) + 1]
+        return self.data.dtype.type(self.value)
+
+    def __setitem__(self, cell, value):
+        i, j = cell
+        self.data[i + j, i - self.first(i + j) + 1] = value
+
+    def __array__(self, dtype=None, copy=None):
+        full = numpy.full(self.shape, self.value, self.data.dtype)
+        i, j, d, k = self.cells()
+        full[i, j] = self.data[d, k]
+        return full if dtype is None else full.astype(dtype)
+
+
+def bandBoundary(f, rowGaps, colGaps, trace=None):
+    '''Initialize the cells of the first row and the first column of the
+    BandMatrix f.'''
+    m, n = f.shape
+    f[0, 0] = 0
+    for j in range(1, min(f.band[1] + 1, n)):
+        f[0, j] = f[0, j - 1] + rowGaps[0]
+        if trace is not None:
+            trace[0, j] = GAP_FIRST
+    for i in range(1, min(1 - f.band[0], m)):
+        f[i, 0] = f[i - 1, 0] + colGaps[0]
+        if trace is not None:
+            trace[i, 0] = GAP_SECOND
+
+
+def bandFill(f, scores, rowGaps, colGaps, trace=None):
+    '''fill() for the inner cells of the BandMatrix f, and optionally of
+    the traceback BandMatrix, given the substitution scores function.'''
+    m, n = f.shape
+    hi = f.band[1]
+    data = f.data
+    # Substitution scores of the inner cells in the same layout as f.
+    s = numpy.zeros(data.shape)
+    i, j, d, k = f.cells()
+    inner = (i > 0) & (j > 0)
+    s[d[inner], k[inner]] = scores(i[inner], j[inner])
+    for d in range(2, m + n - 1):
+        a, b = extent(d, m, n, f.band)
+        a, b = max(1, a), min(d - 1, b)
+        if a > b:
+            continue
+        first = -((hi - d) // 2)
+        start = a - first + 1
+        stop = b - first + 2
+        # The cells of the previous anti-diagonal are stored one column
+        # further if its part of the band starts a row earlier.
+        shift = first + (hi - d + 1) // 2
+
+        # Match elements.
+        ab = data[d - 2, start:stop] + s[d, start:stop]
+
+        # Gap on first sequence.
+        ga = data[d - 1, start + shift:stop + shift] + rowGaps[a:b + 1]
+
+        # Gap on second sequence.
+        gb = data[d - 1, start + shift - 1:stop + shift - 1] \
+            + colGaps[d - b:d - a + 1][::-1]
+
+        best = numpy.maximum(ab, numpy.maximum(ga, gb))
+        data[d, start:stop] = best
+        if trace is not None:
+            trace.data[d, start:stop] = (best == ab) * MATCH \
+                | (best == ga) * GAP_FIRST | (best == gb) * GAP_SECOND
+    return f
+
+
+def diagonalsMany(m, lengths, scores, rowGaps, colGaps, floor=None,
+                  band=None):
+    '''diagonals() of many matrices with m rows at once, one for each entry
+    of lengths giving its number of columns.
+
+    Yields (d, lo, hi, values) where values[k, i] holds cell (i, d - i) of
+    the k-th matrix for lo <= i <= hi. The band can hold arrays with the
+    band of every matrix, and cells outside of it are -inf.
+    '''
+    lengths = numpy.asarray(lengths)
+    count = len(lengths)
+    n = lengths.max()
+    cover = None
+    if band is not None:
+        lower = numpy.broadcast_to(band[0], (count,))
+        upper = numpy.broadcast_to(band[1], (count,))
+        # Band of the diagonals computed for all of the matrices. Cells
+        # outside the band of their matrix are only masked if the bands
+        # differ.
+        cover = (int(lower.min()), int(upper.max()))
+        if (lower == cover[0]).all() and (upper == cover[1]).all():
+            band = None
+    older = numpy.zeros((count, m))
+    previous = numpy.zeros((count, m))
+    current = numpy.zeros((count, m))
+    yield 0, 0, 0, current
+    for d in range(1, m + n - 1):
+        older, previous, current = previous, current, older
+        lo, hi = extent(d, m, n, cover)
+        if cover is not None:
+            # Cells just outside of the band are read by the next diagonal.
+            if lo > 0:
+                current[:, lo - 1] = -numpy.inf
+            if hi < m - 1:
+                current[:, hi + 1] = -numpy.inf
+        i = diagonal(d, m, n, cover)
+        if len(i):
+            j = d - i
+            # The rows are consecutive, so slices take the place of i.
+            a, b = i[0], i[-1] + 1
+
+            # Match elements.
+            ab = older[:, a - 1:b - 1] + scores(i, j)
+
+            # Gap on first sequence.
+            ga = previous[:, a:b] + rowGaps[a:b]
+
+            # Gap on second sequence.
+            gb = previous[:, a - 1:b - 1] \
+                + colGaps[:, d - b + 1:d - a + 1][:, ::-1]
+
+            value = numpy.maximum(ab, numpy.maximum(ga, gb))
+            if floor is not None:
+                value = numpy.maximum(floor, value)
+            if band is not None:
+                value[(j - i < lower[:, None]) | (j - i > upper[:, None])] = \
+                    -numpy.inf
+            current[:, a:b] = value
+        if d < n and lo == 0:
+            current[:, 0] = previous[:, 0] + rowGaps[0]
+            if floor is not None:
+                current[:, 0] = numpy.maximum(floor, current[:, 0])
+            if band is not None:
+                current[d > upper, 0] = -numpy.inf
+        if d < m and hi == d:
+            current[:, d] = previous[:, d - 1] + colGaps[:, 0]
+            if floor is not None:
+                current[:, d] = numpy.maximum(floor, current[:, d])
+            if band is not None:
+                current[-d < lower, d] = -numpy.inf
+        yield d, lo, hi, current
+
+
+def sweepMany(m, lengths, scores, rowGaps, colGaps, floor=None, band=None):
+    '''Compute the last cell and the maximum of many matrices with m rows at
+    once, one for each entry of lengths giving its number of columns.
+
+    scores(i, j) must return the substitution scores of the cells (i, j) of
+    every matrix as a (len(lengths), len(i)) array, and colGaps holds the
+    gap scores of every matrix as a len(lengths) x max(lengths) array.
+    Columns past the end of a matrix are computed but ignored. With a band,
+    holding either one band or arrays with the band of every matrix, only
+    the cells within the bands are computed.
+    '''
+    lengths = numpy.asarray(lengths)
+    corners = numpy.zeros(len(lengths))
+    maxima = numpy.full(len(lengths), -numpy.inf)
+    for d, lo, hi, values in diagonalsMany(m, lengths, scores, rowGaps,
+                                           colGaps, floor, band):
+        if lo <= hi:
+            inside = (d - numpy.arange(lo, hi + 1)) < lengths[:, None]
+            maxima = numpy.maximum(maxima, numpy.where(
+                inside, values[:, lo:hi + 1], -numpy.inf).max(1))
+        done = lengths == d - m + 2
+        corners[done] = values[done, m - 1]
+    return corners, maxima
@@ -2,52 +2,37 @@
 
 import argparse
 import pickle
-from itertools import islice, tee
-from operator import itemgetter
-
-import pp
 
+import alignment.candidatelibrary
+import alignment.parallel
 import alignment.sequenceloader
-import alignment.alignmenthelper
 import alignment.substmatrices
 
 
-def chunk(data, n=24):
-    '''Splits input data (dict) into n equal chunks.'''
-    it = iter(data)
-    for i, iterator in enumerate(tee(it, n)):
-        yield {k: data[k] for k in islice(iterator, i, None, n)}
-
-
-def findbestalignment(target, candidates, targetid, window,
-                      matrix, gap):
+def findbestalignment(target, library, window):
     '''Find the candidate that best aligns with the target'''
     lpsl = alignment.sequenceloader.localpatternsequenceloader()
     tseq = lpsl.load(target, window)
-    cscores = []
-    for candidate in candidates:
-        cseq = lpsl.load(candidate, window)
-        helper = alignment.alignmenthelper.AlignmentHelper()
-        score = helper.alignStrict(tseq, cseq,
-                                   substMatrix=matrix, gapScore=gap,
-                                   btrace=False)
-        cscores.append(
-            (candidate, cseq, score, candidates[candidate]))
-    cscores = sorted(cscores, key=operator.itemgetter(2), reverse=True)
-    top = cscores[0]
-    return tseq, top[0], top[1], top[3]
-
-
-def alignmany(tpats, patrots, window, matrix, gap):
+    cpat, cseq, crot, score = library.best_matches(tseq)[0]
+    return tseq, cpat, cseq, crot
+
+
+def alignmany(tpats, library, window):
     '''Run alignment sequentially'''
     results = []
     for k in tpats:
         tseq, cpat, cseq, crot = findbestalignment(
-            tpats[k], patrots, k, window, matrix, gap)
+            tpats[k], library, window)
         results.append((k, tpats[k], tseq, cpat, cseq, crot))
     return results
 
 
+def alignpattern(item, options):
+    '''Align one target pattern, given as a (key, pattern) pair.'''
+    k, tpat = item
+    return alignmany({k: tpat}, **options)[0]
+
+
 def loadpatrot(patrotfile):
     patrots = {}
     with open(patrotfile) as fh:
@@ -59,7 +44,8 @@ def loadpatrot(patrotfile):
             patrots[pat] = (p, x, y, z)
     return patrots
 
-def main(targetfile, candidatesfile, window, matrix, gap, outfile):
+def main(targetfile, candidatesfile, window, matrix, gap, outfile,
+         workers=None, chunksize=10):
     #Load targetfile
     with open(targetfile, 'rb') as fh:
         tpats = pickle.load(fh)
@@ -68,33 +54,12 @@ def main(targetfile, candidatesfile, window, matrix, gap, outfile):
     matrices = alignment.substmatrices.SubstitutionMatrices('length')
     matrix = matrices.getmatrix(matrix)
 
-    #Set up ppservers
-    try:
-        ppservers = open('/tmp/nodelist').read().strip().split()
-    except IOError:
-        # It wasn't called by slrm bashscript. Run locally.
-        jobserver = pp.Server()
-    else:
-        ppservers = tuple(pp + ':2048' for pp in ppservers)
-        jobserver = pp.Server(ppservers=ppservers)
-    ncpus = jobserver.get_ncpus() * len(ppservers)
-
-    jobs = []
-    for subset in chunk(tpats, ncpus*10):
-        job = jobserver.submit(
-            alignmany,
-            args=(subset, patrots, window, matrix, gap),
-            depfuncs=(findbestalignment,),
-            modules=('operator',
-                     'alignment.sequenceloader',
-                     'alignment.alignmenthelper'))
-        jobs.append(job)
-
-    jobserver.wait()
-
-    results = []
-    for job in jobs:
-        results.extend(job())
+    # Candidates are parsed once, and sent to each worker only once.
+    library = alignment.candidatelibrary.CandidateLibrary(
+        patrots, window, matrix, gap)
+    options = dict(library=library, window=window)
+    results = list(alignment.parallel.imap_unordered(
+        alignpattern, tpats.items(), options, workers, chunksize))
     with open(outfile, 'wb') as fh:
         pickle.dump(results, fh)
 
@@ -117,8 +82,14 @@ if __name__ == '__main__':
     parser.add_argument('--gap', type=float,
                         default=-1.0,
                         help='Score for each gap')
+    parser.add_argument('--workers', type=int,
+                        help='Number of worker processes '
+                        '(default: number of CPUs)')
+    parser.add_argument('--chunksize', type=int, default=10,
+                        help='Number of patterns sent to a worker at once')
     args = parser.parse_args()
 
     main(args.targetfile, args.candidatesfile, args.window,
-         args.matrix, args.gap, args.outfile)
+         args.matrix, args.gap, args.outfile,
+         args.workers, args.chunksize)
     
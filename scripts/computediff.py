@@ -2,46 +2,67 @@
 
 import pickle
 import pathlib
-import math
 import argparse
 
+import numpy
+
 import alignment.conv as conv
+import alignment.parallel
 
 
-def getrotation(line):
-    x, y, z, phi = map(float, line.split()[15:19])
-    return conv.ev2mat(phi, [x, y, z])
+def getrotations(lines):
+    """Return rotation matrices of many result lines at once."""
+    values = numpy.array([line.split()[15:19] for line in lines],
+                         dtype=float).reshape((-1, 4))
+    return conv.ev2mat_batch(values[:, 3], values[:, :3])
 
 
-def main(pklfile, protdir, outfile):
-    with open(pklfile, 'rb') as fh:
-        guesses = pickle.load(fh)
-    results = {}
+def groupguesses(guesses):
+    """Return rotations of the guesses by line number, by protein."""
+    grouped = {}
     for guess in guesses:
-        results[guess[0]] = guess[1:]
+        protid, lineno = guess[0]
+        grouped.setdefault(protid, {})[lineno] = guess[5]
+    return grouped
 
-    protdir = pathlib.Path(protdir)
-    for protf in protdir.iterdir():
-        protid = protf.stem
-        with protf.open() as f:
-            lines = f.readlines()
-        for lineno, line in enumerate(lines):
-            key = (protid, lineno+1)
-            if key in results:
-                guessrot = getrotation(line)
-                truerot = conv.ev2mat(results[key][4][0],
-                                      results[key][4][1:])
-                diff = conv.so3dist(guessrot, truerot)
-                results[key] = (*results[key],
-                                guessrot, truerot, diff)
-
-    output = []
-    for k in results:
-        t = '{}\t{}\t{}'.format(k[0], k[1], results[k][-1])
-        output.append(t)
 
+def protdiffs(protf, guesses):
+    """Return (protid, lineno, diff) of the guesses of one protein file."""
+    protf = pathlib.Path(protf)
+    truths = guesses[protf.stem]
+    last = max(truths)
+    linenos = []
+    lines = []
+    with protf.open() as f:
+        # Only read up to the last line needed.
+        for lineno, line in enumerate(f, 1):
+            if lineno in truths:
+                linenos.append(lineno)
+                lines.append(line)
+            if lineno == last:
+                break
+    guessrots = getrotations(lines)
+    truerots = conv.ev2mat_batch(
+        [truths[lineno][0] for lineno in linenos],
+        numpy.reshape([truths[lineno][1:] for lineno in linenos], (-1, 3)))
+    diffs = conv.so3dist_batch(guessrots, truerots)
+    return [(protf.stem, lineno, diff)
+            for lineno, diff in zip(linenos, diffs)]
+
+
+def main(pklfile, protdir, outfile, workers=None, chunksize=16):
+    with open(pklfile, 'rb') as fh:
+        guesses = groupguesses(pickle.load(fh))
+
+    protdir = pathlib.Path(protdir)
+    # The guesses are sent to each worker once, tasks only carry the file.
+    tasks = (str(protf) for protf in protdir.iterdir()
+             if protf.stem in guesses)
     with open(outfile, 'w') as fh:
-        fh.write('\n'.join(output))
+        for diffs in alignment.parallel.imap_unordered(
+                protdiffs, tasks, guesses, workers, chunksize):
+            for protid, lineno, diff in diffs:
+                fh.write('{}\t{}\t{}\n'.format(protid, lineno, diff))
 
 
 if __name__ == '__main__':
@@ -53,5 +74,12 @@ if __name__ == '__main__':
                         'protein files.')
     parser.add_argument('outfile',
                         help='Output file')
+    parser.add_argument('--workers', type=int,
+                        help='Number of worker processes '
+                        '(default: number of CPUs)')
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help='Number of protein files sent to a worker '
+                        'at once')
     args = parser.parse_args()
-    main(args.pklfile, args.protdir, args.outfile)
+    main(args.pklfile, args.protdir, args.outfile,
+         args.workers, args.chunksize)
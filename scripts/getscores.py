@@ -1,41 +1,35 @@
 #!/usr/bin/env python
 
 import argparse
+import multiprocessing
 import pathlib
 
-import pp
-
+import alignment.parallel
 import alignment.sequenceloader
-import alignment.alignmenthelper
+import alignment.sequencealigner as seqal
 import alignment.substmatrices
+from alignment.vocabulary import Vocabulary
 
-SUBST_MATRIX = alignment.substmatrices.simplematrix
+SUBST_MATRIX = alignment.substmatrices.SubstitutionMatrices().simplematrix
 DEFAULT_GAP_SCORE = -1
 
 
-def alignmany(target, cands, length,
-              match=None, mismatch=None, mat=None, gap=-1):
-    """Return alignment score for many candidate structures."""
-    """Requires pathlib module"""
-    csl = alignment.sequenceloader.clustersequenceloader()
-    helper = alignment.alignmenthelper.AlignmentHelper()
-    tseq = csl.load(target, length)
-    targetname = pathlib.Path(target).stem
-    results = {}
-    for cand in cands:
-        cname = pathlib.Path(cand).stem
-        cseq = csl.load(cand, length)
-        score = helper.alignStrict(tseq, cseq,
-                           matchScore=match, mismatchScore=mismatch,
-                           substMatrix=mat, gapScore=gap,
-                           btrace=False)
-        results[cname] = score
-    return results
+def aligntarget(task, data):
+    """Return alignment scores of the candidates of one target."""
+    target, cands = task
+    aligner = data['aligner']
+    tseq = data['sequences'][target]
+    cseqs = [data['sequences'][cand] for cand in cands]
+    scores = aligner.align_many(tseq, cseqs)
+    cnames = [pathlib.Path(cand).stem for cand in cands]
+    return dict(zip(cnames, scores))
 
 
 def run(tdir, cdir, seqf,
         match=None, mismatch=None, mat=None,
-        gap=DEFAULT_GAP_SCORE, output=None):
+        gap=DEFAULT_GAP_SCORE, output=None,
+        banded=False, bandwidth=None, workers=None, chunksize=1,
+        cache=None):
     targetdir = pathlib.Path(tdir)
     canddir = pathlib.Path(cdir)
     if match is None and mat is None:
@@ -56,44 +50,42 @@ def run(tdir, cdir, seqf,
             target, length, __ = line.split()
             seqlen[target] = int(length)
 
-    # Set up ppservers
-    try:
-        ppservers = open('tmp/nodelist').read().strip().split()
-        ppservers = tuple(pp + ':2048' for pp in ppservers)
-        jobserver = pp.server(ppservers=ppservers)
-    except IOError:
-        # It wasn't called by slrm bashscript. Run locally.
-        jobserver = pp.Server()
-    ncpus = jobserver.get_ncpus()
-    if len(files) < ncpus:
-        jobserver.set_ncpus(len(files))
-
-    jobs = []
+    tasks = []
+    paths = []
+    lengths = []
     for targetfile in targetdir.iterdir():
         targetname = targetfile.stem
         try:
             cands = [str(f.resolve()) for f in files[targetname]]
         except KeyError:
             continue
-        job = jobserver.submit(alignmany,
-                               args=(str(targetfile.resolve()),
-                                     cands,
-                                     seqlen[targetfile.stem],
-                                     match,
-                                     mismatch,
-                                     mat,
-                                     gap),
-                               modules=('pathlib',
-                                        'alignment.sequenceloader',
-                                        'alignment.alignmenthelper',
-                                        'alignment.substmatrices'))
-        jobs.append(job)
+        target = str(targetfile.resolve())
+        tasks.append((target, cands))
+        paths += [target] + cands
+        lengths += [seqlen[targetname]] * (len(cands) + 1)
+
+    # Load all sequences at once, and send them to each worker once.
+    vocabulary = Vocabulary()
+    loader = alignment.sequenceloader.clustersequenceloader()
+    sequences = loader.loadmany(paths, lengths, vocabulary, cache)
+    if match is not None and mismatch is not None:
+        scoring = seqal.SimpleScoring(match, mismatch)
+    else:
+        scoring = seqal.MatrixScoring(vocabulary.encodeScoreMatrix(mat))
+    if banded:
+        aligner = seqal.BandedStrictGlobalSequenceAligner(
+            scoring, gap, bandwidth)
+    else:
+        aligner = seqal.StrictGlobalSequenceAligner(scoring, gap)
+    data = dict(aligner=aligner, sequences=dict(zip(paths, sequences)))
 
-    jobserver.wait()
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(tasks)))
 
     out = []
-    for job in jobs:
-        result = job()
+    for result in alignment.parallel.imap_unordered(
+            aligntarget, tasks, data, workers, chunksize):
         out += ['{}\t{}'.format(k, result[k]) for k in result]
     if output is None:
         print('\n'.join(out))
@@ -127,6 +119,17 @@ if __name__ == '__main__':
                         help='Score for each gap')
     parser.add_argument('--output',
                         help='Output file')
+    parser.add_argument('--banded', action='store_true',
+                        help='Only align near the main diagonal')
+    parser.add_argument('--bandwidth', type=int,
+                        help='Initial band width for --banded')
+    parser.add_argument('--workers', type=int,
+                        help='Number of worker processes '
+                        '(default: number of CPUs)')
+    parser.add_argument('--chunksize', type=int, default=1,
+                        help='Number of targets sent to a worker at once')
+    parser.add_argument('--cache',
+                        help='.npz file caching the parsed sequence files')
     args = parser.parse_args()
     if args.matrix:
         matrices = alignment.substmatrices.SubstitutionMatrices()
@@ -135,4 +138,6 @@ if __name__ == '__main__':
         mat = None
 
     run(args.targetdir, args.canddir, args.seqf,
-        args.match, args.mismatch, mat, args.gap, args.output)
+        args.match, args.mismatch, mat, args.gap, args.output,
+        args.banded, args.bandwidth, args.workers, args.chunksize,
+        args.cache)
@@ -23,17 +23,10 @@ start=$(date +%s)
 echo Clearing SCRATCH folder
 rm -f ${SCRATCH}/*
 
-echo Writing hostnames
-scontrol show hostnames $SLURM_NODELIST > /tmp/nodelist
-
 echo Activate align environment
 source activate align
 
 
-echo Starting servers
-srun ppserver.py -p 2048 -k 10800 -t 30 &
-sleep 1 # sleep a bit to ensure that the servers have started
-
 echo Starting Python program
 getscores.py /work/austmathjea/gdt/targets \
 	     /work/austmathjea/gdt/candidates \
@@ -46,6 +39,4 @@ echo End time: "$(date)"
 dur=$(date -d "0 $end sec - $start sec" +%T)
 echo Duration: "$dur"
 
-sleep 35 # this should kill all remote ppservers
-
 echo Done.